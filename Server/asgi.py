@@ -14,3 +14,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Server.settings')
 
 application = get_asgi_application()
+
+# Warm the in-memory search suggestions; lookups build it lazily if this fails.
+from django.db import DatabaseError
+from products.suggest import suggest_index
+
+try:
+    suggest_index.build()
+except DatabaseError:
+    pass
+
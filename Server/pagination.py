@@ -0,0 +1,205 @@
+# Server/pagination.py
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from operator import or_
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+# Below this many estimated rows an exact COUNT(*) is cheap enough to just run
+EXACT_COUNT_BELOW = 10000
+
+
+def estimate_count(queryset):
+    """
+    Row count as estimated by the PostgreSQL planner, so large or joined lists
+    don't need a full COUNT(*). Small results and other databases get an
+    exact count. Returns (count, is_estimate).
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count(), False
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_BELOW:
+        return queryset.count(), False
+    return estimate, True
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, which would skip or repeat rows around the anchor
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def _encode_cursor(values, direction, position):
+    data = json.dumps(
+        {'v': [_encode_value(value) for value in values], 'd': direction, 'p': position},
+        cls=DjangoJSONEncoder,
+    )
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(token, key_count):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values, direction, position = data['v'], data['d'], int(data['p'])
+        if isinstance(values, list):
+            values = [_decode_value(value) for value in values]
+    except (ValueError, TypeError, KeyError, InvalidOperation, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != key_count or direction not in ('next', 'prev'):
+        return None
+    return values, direction, max(position, 0)
+
+
+def _row_value(row, field):
+    for part in field.split('__'):
+        row = row[part] if isinstance(row, dict) else getattr(row, part)
+    return row
+
+
+class CursorPage:
+    """One page of a CursorPaginator; iterates like a Paginator page and builds its own prev/next links."""
+
+    def __init__(self, object_list, request, start, next_cursor, previous_cursor, total=None, total_is_estimate=False):
+        self.object_list = object_list
+        self.request = request
+        self.start = start
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    def __getstate__(self):
+        # Pages are cached without their request; the reader attaches its own
+        state = self.__dict__.copy()
+        state['request'] = None
+        return state
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def start_index(self):
+        return self.start + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.start + len(self.object_list)
+
+    def _url(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params[CURSOR_PARAM] = cursor
+        return f"?{params.urlencode()}"
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.next_cursor else ''
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor) if self.previous_cursor is not None else ''
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a queryset. Pages are fetched with a WHERE on the
+    ordering columns of the last row seen instead of an OFFSET, so every page
+    costs the same however deep it is. The ordering must end in a unique
+    column (usually id) and its columns must not be NULL or floating point,
+    which would not compare equal to the value stored in the cursor.
+
+    total is None (no count), 'estimate' (planner estimate) or 'exact'.
+    """
+
+    def __init__(self, queryset, per_page, ordering, total=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.total = total
+
+    def _after(self, values, backwards):
+        clauses, equal = [], {}
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            clauses.append(Q(**equal, **{f'{field}__{lookup}': value}))
+            equal[field] = value
+        return reduce(or_, clauses)
+
+    def _cursor_values(self, row):
+        return [_row_value(row, field) for field, _ in self.keys]
+
+    def get_page(self, request):
+        cursor = _decode_cursor(request.GET.get(CURSOR_PARAM, ''), len(self.keys))
+        queryset = self.queryset.order_by(*self.ordering)
+        backwards = cursor is not None and cursor[1] == 'prev'
+
+        if cursor is not None:
+            values, _, position = cursor
+            queryset = queryset.filter(self._after(values, backwards))
+            if backwards:
+                queryset = queryset.reverse()
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if cursor is None:
+            start, has_next, has_previous = 0, has_more, False
+        elif backwards:
+            rows.reverse()
+            start = max(position - len(rows), 0) if has_more else 0
+            has_next, has_previous = True, has_more
+        else:
+            start, has_next, has_previous = position, has_more, True
+        if not rows:
+            has_next = False
+
+        next_cursor = _encode_cursor(self._cursor_values(rows[-1]), 'next', start + len(rows)) if has_next else None
+        previous_cursor = None
+        if has_previous:
+            # A cursor that ran past the end has no rows to anchor on; send it back to the first page
+            previous_cursor = _encode_cursor(self._cursor_values(rows[0]), 'prev', start) if rows else ''
+
+        total, is_estimate = None, False
+        if self.total == 'exact':
+            total = self.queryset.count()
+        elif self.total == 'estimate':
+            if not has_next:
+                total = start + len(rows)
+            else:
+                total, is_estimate = estimate_count(self.queryset)
+                total = max(total, start + len(rows) + 1)
+
+        return CursorPage(rows, request, start, next_cursor, previous_cursor, total, is_estimate)
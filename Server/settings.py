@@ -59,6 +59,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites', 
+    'django.contrib.postgres',
     "allauth",
     "allauth.account",
     "allauth.socialaccount",
@@ -78,6 +79,7 @@ INSTALLED_APPS = [
     'coupons',
     'offers',
     'wallet',
+    'documents',
 ]
 
 # Site ID Configuration
@@ -94,6 +96,11 @@ else:
 # Razorpay TEST KEYS Configuration
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET')
+# checkout.gateway.StubGateway swaps in a local fake for tests and offline development
+PAYMENT_GATEWAY = config("PAYMENT_GATEWAY", default="checkout.gateway.RazorpayGateway")
+RAZORPAY_TIMEOUT = 10
+RAZORPAY_POOL_SIZE = 10
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -118,6 +125,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.catalog',
+                'cart.context_processors.cart',
             ],
         },
     },
@@ -139,6 +148,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# CACHE_BACKEND picks locmem (default), file or redis; CACHE_LOCATION is the
+# directory for file and the URL for redis
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'dingdong'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[config("CACHE_BACKEND", default="locmem")]
+
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': config("CACHE_LOCATION", default=_cache_location),
+        'TIMEOUT': 60 * 15,
+        'KEY_PREFIX': 'dingdong',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -180,6 +209,10 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# PDFs rendered by run_pdf_worker, named by a hash of their HTML. Kept out of
+# MEDIA_ROOT because invoices are private; they are served by documents.views.
+PDF_CACHE_DIR = config("PDF_CACHE_DIR", default=str(BASE_DIR / 'pdf_cache'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
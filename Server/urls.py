@@ -40,6 +40,7 @@ urlpatterns = [
     path('coupons/', include('coupons.urls')),
     path('offers/', include('offers.urls')),
     path('wallet/', include('wallet.urls')),
+    path('documents/', include('documents.urls')),
     
 ]
 handler404 = "home.views.custom_404"
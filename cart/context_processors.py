@@ -0,0 +1,8 @@
+# cart/context_processors.py
+from functools import partial
+from .utils import get_cart_count
+
+
+def cart(request):
+    # Passed uncalled so the counter is only read by templates that show it
+    return {'cart_count': partial(get_cart_count, request.user)}
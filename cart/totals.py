@@ -0,0 +1,74 @@
+# cart/totals.py
+from decimal import Decimal
+from django.db.models import Prefetch
+from offers.utils import get_offer_prices
+from products.models import ProductImage
+from products.utils import first_image
+
+
+class CartTotals:
+    """
+    Prices, totals and checkout flags for a cart, worked out in one pass over
+    a single query of its items plus the batched offer lookup.
+
+    Every item gets original_price, final_price, discount_percentage,
+    offer_type, original_total_price, item_subtotal, item_discount,
+    stock_available and is_available (and first_image with images=True).
+    """
+
+    def __init__(self, cart, images=False):
+        items = cart.items.select_related('variant__product__brand', 'variant__product__category')
+        if images:
+            items = items.prefetch_related(
+                Prefetch('variant__images', queryset=ProductImage.objects.order_by('id'))
+            )
+        self.items = list(items)
+        prices = get_offer_prices(item.variant for item in self.items)
+
+        self.original_total = Decimal('0.00')
+        self.subtotal = Decimal('0.00')
+        self.discount = Decimal('0.00')
+        self.total_items = 0
+        self.has_offer = False
+        self.has_out_of_stock = False
+        self.has_unlisted = False
+
+        for item in self.items:
+            variant = item.variant
+            product = variant.product
+            item.final_price, item.discount_percentage, item.offer_type = prices[variant.id]
+            item.original_price = variant.price
+            item.original_total_price = variant.price * item.quantity
+            item.item_subtotal = item.final_price * item.quantity
+            item.item_discount = Decimal('0.00')
+            if item.discount_percentage > 0:
+                item.item_discount = item.original_total_price - item.item_subtotal
+                self.has_offer = True
+            item.stock_available = item.quantity <= variant.stock
+            item.is_available = (
+                variant.is_listed and
+                product.is_listed and
+                product.category.is_listed and
+                product.brand.is_listed
+            )
+            if images:
+                item.first_image = first_image(variant)
+
+            self.original_total += item.original_total_price
+            self.subtotal += item.item_subtotal
+            self.discount += item.item_discount
+            self.total_items += item.quantity
+            self.has_out_of_stock = self.has_out_of_stock or not item.stock_available
+            self.has_unlisted = self.has_unlisted or not item.is_available
+
+    @property
+    def is_empty(self):
+        return not self.items
+
+    @property
+    def can_checkout(self):
+        return bool(self.items) and not (self.has_out_of_stock or self.has_unlisted)
+
+    def get(self, item_id):
+        """The priced item with this id, or None if it isn't in the cart."""
+        return next((item for item in self.items if item.id == item_id), None)
@@ -0,0 +1,33 @@
+# cart/utils.py
+from django.conf import settings
+from django.core.cache import cache
+from .models import CartItem
+
+# locmem is per process, so a worker only sees its own adjustments and the
+# count must expire soon; shared backends (file, redis) can keep it longer
+CART_COUNT_TIMEOUT = 30 if settings.CACHES['default']['BACKEND'].endswith('LocMemCache') else 60 * 15
+
+
+def _cart_count_key(user_id):
+    return f"cart:count:{user_id}"
+
+
+def get_cart_count(user):
+    """Number of lines in the user's cart, counted once and then kept in the cache for CART_COUNT_TIMEOUT."""
+    if not user.is_authenticated:
+        return 0
+    return cache.get_or_set(
+        _cart_count_key(user.id), lambda: CartItem.objects.filter(cart__user=user).count(), CART_COUNT_TIMEOUT
+    )
+
+
+def adjust_cart_count(user_id, delta):
+    """Move a cached counter by delta; a missing counter is simply recounted on the next read."""
+    try:
+        cache.incr(_cart_count_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def reset_cart_count(user_id):
+    cache.delete(_cart_count_key(user_id))
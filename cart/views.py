@@ -3,12 +3,10 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from .models import Cart, CartItem
+from .utils import adjust_cart_count
+from .totals import CartTotals
 from products.models import ProductVariant
 from django.contrib.auth.decorators import login_required
-from decimal import Decimal
-from offers.utils import get_offer_details
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
 
 @login_required
 @require_POST
@@ -46,6 +44,7 @@ def add_to_cart(request, product_variant_id):
                 variant=variant, 
                 quantity=1
             )
+            adjust_cart_count(request.user.id, 1)
             message = 'Added to cart.'
 
         return JsonResponse({
@@ -62,70 +61,19 @@ def add_to_cart(request, product_variant_id):
 
 def cart(request):
     cart, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related(
-        'variant__product__brand',
-        'variant__product__category',
-        'variant__product__product_offer',
-        'variant__product__brand__brand_offer'
-    ).prefetch_related('variant__images').all()
-    
-    subtotal = Decimal('0.00')
-    total_discount = Decimal('0.00')
-    original_total_price = Decimal('0.00')
-    total_items = cart.get_total_items()
-    has_out_of_stock = False
-    has_unlisted = False
-    
-    for item in cart_items:
-        item.stock_available = item.is_in_stock()
-        item.first_image = item.variant.images.first()
-        item.is_available = (
-            item.variant.is_listed and 
-            item.variant.product.is_listed and
-            item.variant.product.category.is_listed and
-            item.variant.product.brand.is_listed
-        )
+    totals = CartTotals(cart, images=True)
 
-        item.original_price = item.variant.price
-        item.original_total_price = item.original_price * item.quantity
-        original_total_price += item.original_total_price
-        
-        item.discounted_price, item.discount_percentage, item.offer_type = get_offer_details(
-            item.variant.product, 
-            item.original_price
-        )
-
-        if item.discount_percentage > 0:
-            discount_amount = item.original_price - item.discounted_price
-            item.item_discount = discount_amount * item.quantity
-            total_discount += item.item_discount
-        else:
-            item.item_discount = Decimal('0.00')
-
-        item.item_subtotal = item.discounted_price * item.quantity
-        subtotal += item.item_subtotal
-        
-        if not item.stock_available:
-            has_out_of_stock = True
-        if not item.is_available:
-            has_unlisted = True
-            
-    print(original_total_price)
-    total = subtotal 
-    
-    can_checkout = not (has_out_of_stock or has_unlisted) and cart_items.exists()
-    
     context = {
         'cart': cart,
-        'cart_items': cart_items,
-        "original_total_price": original_total_price,
-        'subtotal': subtotal,
-        'total_discount': total_discount,
-        'total': total,
-        'total_items': total_items,
-        'can_checkout': can_checkout,
-        'has_out_of_stock': has_out_of_stock,
-        'has_unlisted': has_unlisted,
+        'cart_items': totals.items,
+        "original_total_price": totals.original_total,
+        'subtotal': totals.subtotal,
+        'total_discount': totals.discount,
+        'total': totals.subtotal,
+        'total_items': totals.total_items,
+        'can_checkout': totals.can_checkout,
+        'has_out_of_stock': totals.has_out_of_stock,
+        'has_unlisted': totals.has_unlisted,
     }
     return render(request, 'user_side/cart/cart.html', context)
 
@@ -133,7 +81,9 @@ def cart(request):
 @require_POST
 def update_cart_quantity(request, item_id):
     try:
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        cart_item = get_object_or_404(
+            CartItem.objects.select_related('cart', 'variant__product'), id=item_id, cart__user=request.user
+        )
         action = request.POST.get('action')
 
         if action not in ['increment', 'decrement']:
@@ -174,61 +124,25 @@ def update_cart_quantity(request, item_id):
                     'message_type': 'warning'
                 })
         
-        original_price = cart_item.variant.price
-        discounted_price, discount_percentage, offer_type = get_offer_details(
-            cart_item.variant.product,
-            original_price
-        )
-        item_subtotal = discounted_price * cart_item.quantity
-        cart = cart_item.cart
-        cart_items = cart.items.select_related(
-            'variant__product__brand',
-            'variant__product__category',
-            'variant__product__product_offer',
-            'variant__product__brand__brand_offer'
-        ).all()
-        
-        subtotal = Decimal('0.00')
-        for item in cart_items:
-            item_price, _, _ = get_offer_details(
-                item.variant.product,
-                item.variant.price
-            )
-            subtotal += item_price * item.quantity
-        
-        total_items = cart.get_total_items()
-        
-        has_out_of_stock = False
-        has_unlisted = False
-        for item in cart_items:
-            is_available = (
-                item.variant.is_listed and 
-                item.variant.product.is_listed and
-                item.variant.product.category.is_listed and
-                item.variant.product.brand.is_listed
-            )
-            if not item.is_in_stock():
-                has_out_of_stock = True
-            if not is_available:
-                has_unlisted = True
-        can_checkout = not (has_out_of_stock or has_unlisted) and cart_items.exists()
-        
+        totals = CartTotals(cart_item.cart)
+        item = totals.get(cart_item.id)
+
         return JsonResponse({
             'success': True,
             'message': message,
             'message_type': message_type,
             'data': {
-                'quantity': cart_item.quantity,
-                'item_subtotal': float(item_subtotal),
-                'subtotal': float(subtotal),
-                'total': float(subtotal),
-                'total_items': total_items,
-                'can_increment': cart_item.quantity < cart_item.variant.stock,
-                'can_decrement': cart_item.quantity > 1,
-                'can_checkout': can_checkout,
-                'original_price': float(original_price),
-                'discounted_price': float(discounted_price),
-                'discount_percentage': float(discount_percentage)
+                'quantity': item.quantity,
+                'item_subtotal': float(item.item_subtotal),
+                'subtotal': float(totals.subtotal),
+                'total': float(totals.subtotal),
+                'total_items': totals.total_items,
+                'can_increment': item.quantity < item.variant.stock,
+                'can_decrement': item.quantity > 1,
+                'can_checkout': totals.can_checkout,
+                'original_price': float(item.original_price),
+                'discounted_price': float(item.final_price),
+                'discount_percentage': float(item.discount_percentage)
             }
         })
         
@@ -242,54 +156,25 @@ def update_cart_quantity(request, item_id):
 @require_POST
 def remove_from_cart(request, item_id):
     try:
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        cart_item = get_object_or_404(
+            CartItem.objects.select_related('cart', 'variant__product'), id=item_id, cart__user=request.user
+        )
         product_name = cart_item.variant.product.name
         cart = cart_item.cart
         cart_item.delete()
-        cart_items = cart.items.select_related(
-            'variant__product__brand',
-            'variant__product__category',
-            'variant__product__product_offer',
-            'variant__product__brand__brand_offer'
-        ).all()
-        
-        subtotal = Decimal('0.00')
-        for item in cart_items:
-            item_price, _, _ = get_offer_details(
-                item.variant.product,
-                item.variant.price
-            )
-            subtotal += item_price * item.quantity
-        
-        total_items = cart.get_total_items()
-        is_empty = not cart_items.exists()
-        can_checkout = True
-        if not is_empty:
-            has_out_of_stock = False
-            has_unlisted = False
-            for item in cart_items:
-                is_available = (
-                    item.variant.is_listed and 
-                    item.variant.product.is_listed and
-                    item.variant.product.category.is_listed and
-                    item.variant.product.brand.is_listed
-                )
-                if not item.is_in_stock():
-                    has_out_of_stock = True
-                if not is_available:
-                    has_unlisted = True
-            can_checkout = not (has_out_of_stock or has_unlisted)
-        
+        adjust_cart_count(request.user.id, -1)
+        totals = CartTotals(cart)
+
         return JsonResponse({
             'success': True,
             'message': f'{product_name} removed from cart.',
             'message_type': 'success',
             'data': {
-                'subtotal': float(subtotal),
-                'total': float(subtotal),
-                'total_items': total_items,
-                'is_empty': is_empty,
-                'can_checkout': can_checkout
+                'subtotal': float(totals.subtotal),
+                'total': float(totals.subtotal),
+                'total_items': totals.total_items,
+                'is_empty': totals.is_empty,
+                'can_checkout': totals.can_checkout
             }
         })
         
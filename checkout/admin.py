@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import CheckoutSubmission, DeliveryRule, PaymentEvent
 
-# Register your models here.
+admin.site.register(CheckoutSubmission)
+admin.site.register(PaymentEvent)
+admin.site.register(DeliveryRule)
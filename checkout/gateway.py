@@ -0,0 +1,131 @@
+# checkout/gateway.py
+import hashlib
+import hmac
+import itertools
+from functools import lru_cache
+import razorpay
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+SignatureVerificationError = razorpay.errors.SignatureVerificationError
+
+
+def _signature(secret, message):
+    return hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+class RazorpayGateway:
+    """
+    One Razorpay client for the whole process. Its requests session keeps
+    connections alive in a pool, every call has a timeout, and connection
+    errors and timeouts are retried with exponential backoff by the SDK.
+    """
+
+    def __init__(self, key_id, key_secret, webhook_secret=''):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.RAZORPAY_POOL_SIZE)
+        session.mount('https://', adapter)
+        self.key_id = key_id
+        self.webhook_secret = webhook_secret
+        self.client = razorpay.Client(
+            session=session, auth=(key_id, key_secret), max_retries=3, initial_delay=0.5, max_delay=4,
+        )
+        self.client.enable_retry(True)
+
+    def create_order(self, amount_in_paise, notes):
+        """Create a gateway order and return its id."""
+        razorpay_order = self.client.order.create({
+            'amount': amount_in_paise,
+            'currency': 'INR',
+            'payment_capture': '1',
+            'notes': notes,
+        }, timeout=settings.RAZORPAY_TIMEOUT)
+        return razorpay_order['id']
+
+    def verify_payment_signature(self, razorpay_order_id, razorpay_payment_id, razorpay_signature):
+        """Raise SignatureVerificationError unless the checkout callback was signed by Razorpay."""
+        self.client.utility.verify_payment_signature({
+            'razorpay_order_id': razorpay_order_id,
+            'razorpay_payment_id': razorpay_payment_id,
+            'razorpay_signature': razorpay_signature,
+        })
+
+    def verify_webhook_signature(self, body, signature):
+        """Raise SignatureVerificationError unless a webhook body carries Razorpay's signature."""
+        if not self.webhook_secret:
+            raise SignatureVerificationError('RAZORPAY_WEBHOOK_SECRET is not set')
+        self.client.utility.verify_webhook_signature(body.decode(), signature or '', self.webhook_secret)
+
+    def fetch_payments(self, since):
+        """Every payment made since a datetime, as {'id', 'order_id', 'status'}, a page of 100 per request."""
+        skip = 0
+        while True:
+            page = self.client.payment.all(
+                {'from': int(since.timestamp()), 'count': 100, 'skip': skip}, timeout=settings.RAZORPAY_TIMEOUT,
+            )
+            for payment in page['items']:
+                yield {'id': payment['id'], 'order_id': payment['order_id'], 'status': payment['status']}
+            if len(page['items']) < 100:
+                return
+            skip += 100
+
+
+class StubGateway:
+    """
+    Local stand-in for Razorpay's order and verify API, for tests and offline
+    development. Orders live in memory and signatures are real HMACs over the
+    same payload Razorpay signs, so they verify exactly as they would live.
+    """
+
+    def __init__(self, key_id, key_secret, webhook_secret=''):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
+        self.orders = {}
+        self._ids = itertools.count(1)
+
+    def create_order(self, amount_in_paise, notes):
+        order_id = f"order_stub{next(self._ids):010d}"
+        self.orders[order_id] = {'id': order_id, 'amount': amount_in_paise, 'notes': notes, 'payments': []}
+        return order_id
+
+    def pay(self, razorpay_order_id, status='captured'):
+        """Simulate a payment attempt; returns the fields the checkout callback would post."""
+        payment_id = f"pay_stub{next(self._ids):010d}"
+        self.orders[razorpay_order_id]['payments'].append({'id': payment_id, 'status': status})
+        return {
+            'razorpay_order_id': razorpay_order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': _signature(self.key_secret, f"{razorpay_order_id}|{payment_id}"),
+        }
+
+    def verify_payment_signature(self, razorpay_order_id, razorpay_payment_id, razorpay_signature):
+        expected = _signature(self.key_secret, f"{razorpay_order_id}|{razorpay_payment_id}")
+        if not hmac.compare_digest(expected, razorpay_signature or ''):
+            raise SignatureVerificationError('Razorpay Signature Verification Failed')
+
+    def sign_webhook(self, body):
+        """The X-Razorpay-Signature header Razorpay would send with this body."""
+        return _signature(self.webhook_secret, body.decode())
+
+    def verify_webhook_signature(self, body, signature):
+        if not self.webhook_secret or not hmac.compare_digest(self.sign_webhook(body), signature or ''):
+            raise SignatureVerificationError('Razorpay Signature Verification Failed')
+
+    def fetch_payments(self, since):
+        for order_id, order in self.orders.items():
+            for payment in order['payments']:
+                yield {'id': payment['id'], 'order_id': order_id, 'status': payment['status']}
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    """The process-wide gateway named by settings.PAYMENT_GATEWAY."""
+    gateway_class = import_string(settings.PAYMENT_GATEWAY)
+    return gateway_class(
+        (settings.RAZORPAY_KEY_ID or '').strip(),
+        (settings.RAZORPAY_KEY_SECRET or '').strip(),
+        (settings.RAZORPAY_WEBHOOK_SECRET or '').strip(),
+    )
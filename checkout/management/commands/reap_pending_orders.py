@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from checkout.payments import ABANDONED_AFTER, reap_abandoned_orders, reconcile_pending_orders
+
+
+class Command(BaseCommand):
+    help = (
+        f"Cancel online orders left unpaid for over {ABANDONED_AFTER} and release their stock and coupons. "
+        "Orders paid at the gateway are captured first. Schedule it (e.g. every 10 minutes via cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--restore-cart', action='store_true', help="Put the items back in the users' carts.")
+
+    def handle(self, *args, **options):
+        captured = reconcile_pending_orders()
+        stats = reap_abandoned_orders(batch_size=options['batch_size'], restore_cart=options['restore_cart'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Captured {len(captured)} paid order(s); cancelled {stats['orders']} abandoned order(s), "
+            f"released {stats['stock_lines']} stock line(s) and {stats['coupons']} coupon(s), restored {stats['cart_lines']} cart line(s)."
+        ))
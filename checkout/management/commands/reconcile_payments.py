@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from checkout.payments import process_pending_events, reconcile_pending_orders
+
+
+class Command(BaseCommand):
+    help = "Retry queued Razorpay webhook events and capture stale online orders paid at the gateway. Schedule it (e.g. every 5 minutes via cron)."
+
+    def handle(self, *args, **options):
+        events = process_pending_events()
+        captured = reconcile_pending_orders()
+        self.stdout.write(self.style.SUCCESS(
+            f"Retried {events} webhook event(s); captured {len(captured)} order(s) from the gateway."
+        ))
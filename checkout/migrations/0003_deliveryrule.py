@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+def create_default_rule(apps, schema_editor):
+    DeliveryRule = apps.get_model('checkout', 'DeliveryRule')
+    # The terms checkout used to hardcode
+    DeliveryRule.objects.get_or_create(
+        pincode_prefix='',
+        state='',
+        defaults={'delivery_fee': 40, 'free_delivery_above': 500, 'cod_limit': 1000},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0002_paymentevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode_prefix', models.CharField(blank=True, max_length=10)),
+                ('state', models.CharField(blank=True, max_length=50)),
+                ('delivery_fee', models.DecimalField(decimal_places=2, default=40, max_digits=10)),
+                ('free_delivery_above', models.DecimalField(blank=True, decimal_places=2, default=500, max_digits=10, null=True)),
+                ('allow_cod', models.BooleanField(default=True)),
+                ('cod_limit', models.DecimalField(blank=True, decimal_places=2, default=1000, max_digits=10, null=True)),
+                ('allow_online', models.BooleanField(default=True)),
+                ('allow_wallet', models.BooleanField(default=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('pincode_prefix', 'state')},
+            },
+        ),
+        migrations.RunPython(create_default_rule, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,76 @@
 from django.db import models
+from django.conf import settings
+from orders.models import Order
 
-# Create your models here.
+
+class CheckoutSubmission(models.Model):
+    """
+    One place_order submission, keyed by the token rendered into the checkout
+    form, so double submits and browser retries land on the order the first
+    one created.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='checkout_submissions')
+    key = models.CharField(max_length=64)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='submissions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.key} - {self.order_id}"
+
+
+class PaymentEvent(models.Model):
+    """
+    A Razorpay webhook delivery, stored before it is acted on. event_id is
+    unique so redeliveries of the same event are dropped, and events whose
+    handling failed stay pending for reconcile_payments to retry.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['received_at']
+
+    def __str__(self):
+        return f"{self.event_type} - {self.event_id}"
+
+
+class DeliveryRule(models.Model):
+    """
+    Delivery fee and payment-method terms for a destination, compiled by
+    checkout.rules. An address gets the rule with the longest matching
+    pincode prefix, else the rule for its state, else the default rule (the
+    one with neither set).
+    """
+    pincode_prefix = models.CharField(max_length=10, blank=True)
+    state = models.CharField(max_length=50, blank=True)
+    delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=40)
+    # Subtotal from which delivery is free; blank means never
+    free_delivery_above = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, default=500)
+    allow_cod = models.BooleanField(default=True)
+    # Largest order total COD is offered for; blank means no cap
+    cod_limit = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, default=1000)
+    allow_online = models.BooleanField(default=True)
+    allow_wallet = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['pincode_prefix', 'state']
+
+    def __str__(self):
+        return self.pincode_prefix or self.state or 'Default'
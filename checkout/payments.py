@@ -0,0 +1,294 @@
+# checkout/payments.py
+import logging
+from datetime import timedelta
+from functools import partial
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from cart.utils import reset_cart_count
+from coupons.utils import release_coupons
+from dashboard.rollup import mark_days, order_day
+from orders.models import Order, OrderItem
+from orders.stock import OutOfStock, confirm_reservation, release_reservations
+from wallet.models import Wallet, WalletTransaction
+from .gateway import get_gateway
+from .models import PaymentEvent
+
+# Failed handling of a webhook event is retried this many times before it is parked as failed
+MAX_EVENT_ATTEMPTS = 5
+# Unpaid online orders younger than this are left to the checkout callback and webhooks
+RECONCILE_AFTER = timedelta(minutes=10)
+# ...and older ones are no longer looked up at the gateway
+RECONCILE_WINDOW = timedelta(days=2)
+# Unpaid online orders older than this are given up on by reap_abandoned_orders
+ABANDONED_AFTER = timedelta(minutes=30)
+
+logger = logging.getLogger(__name__)
+
+
+def _refund_to_wallet(order, razorpay_payment_id):
+    """Credit a payment for an order that was cancelled before it arrived to the user's wallet."""
+    wallet, _ = Wallet.objects.get_or_create(user_id=order.user_id)
+    Wallet.objects.filter(id=wallet.id).update(balance=F('balance') + order.total_amount)
+    WalletTransaction.objects.create(
+        wallet=wallet, order=order,
+        amount=order.total_amount, transaction_type='credit'
+    )
+    order.payment_status = 'refunded'
+    order.razorpay_payment_id = razorpay_payment_id
+    order.save(update_fields=['payment_status', 'razorpay_payment_id', 'updated_at'])
+    logger.warning(f"Payment {razorpay_payment_id} arrived for cancelled order {order.order_number}; refunded to wallet")
+
+
+def _cancel_out_of_stock(order):
+    """Cancel an unpaid order whose stock went before its payment arrived, giving back its coupon."""
+    now = timezone.now()
+    order.order_status = 'cancelled'
+    order.cancellation_reason = 'Out of stock'
+    order.cancelled_at = now
+    order.save(update_fields=['order_status', 'cancellation_reason', 'cancelled_at', 'updated_at'])
+    OrderItem.objects.filter(order=order, is_cancelled=False).update(
+        is_cancelled=True, item_status='cancelled', cancelled_at=now,
+    )
+    if order.coupon_code:
+        release_coupons([(order.user_id, order.coupon_code)])
+
+
+def capture_order(order, razorpay_payment_id):
+    """
+    Mark an online order paid: turn its reservation into a sale and store the
+    payment id (its coupon was already redeemed by place_order). The order
+    row is locked, so the checkout callback, webhooks and the reconciler can
+    race on the same order and only the first one captures it. Returns True
+    if this call did.
+    A payment for an order that was cancelled meanwhile (e.g. reaped as
+    abandoned) is not captured: it is refunded to the user's wallet, once.
+    If the reservation lapsed and the stock has gone, the order is cancelled
+    and the payment refunded to the wallet under the same lock, and then
+    OutOfStock is raised outside that block, so a caller that catches it
+    keeps the refund.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(id=order.id)
+        if order.is_paid:
+            return False
+        if order.order_status == 'cancelled':
+            if order.payment_status != 'refunded':
+                _refund_to_wallet(order, razorpay_payment_id)
+            return False
+        try:
+            confirm_reservation(order)
+        except OutOfStock as e:
+            _cancel_out_of_stock(order)
+            _refund_to_wallet(order, razorpay_payment_id)
+            out_of_stock = e
+        else:
+            order.payment_status = 'paid'
+            order.order_status = 'confirmed'
+            order.is_paid = True
+            order.razorpay_payment_id = razorpay_payment_id
+            order.save()
+            return True
+    raise out_of_stock
+
+
+def mark_payment_failed(order_ids):
+    """Flag unpaid orders as failed in one UPDATE; their reservations run out on their own."""
+    return Order.objects.filter(id__in=order_ids, is_paid=False).update(payment_status='failed', updated_at=timezone.now())
+
+
+def _orders_for(payment):
+    return Order.objects.filter(payment_method='online', razorpay_order_id=payment['order_id'])
+
+
+def _payment_captured(payload):
+    payment = payload['payment']['entity']
+    for order in _orders_for(payment):
+        try:
+            capture_order(order, payment['id'])
+        except OutOfStock:
+            pass  # cancelled and refunded by capture_order
+
+
+def _payment_failed(payload):
+    # A failed attempt can be followed by a successful one on the same gateway
+    # order, so the reservation is left to its TTL rather than released here
+    mark_payment_failed(_orders_for(payload['payment']['entity']).values_list('id', flat=True))
+
+
+def _refund_processed(payload):
+    payment = payload['payment']['entity']
+    if payment.get('amount_refunded', 0) >= payment['amount']:
+        _orders_for(payment).filter(is_paid=True).update(payment_status='refunded', updated_at=timezone.now())
+
+
+EVENT_HANDLERS = {
+    'payment.captured': _payment_captured,
+    'payment.failed': _payment_failed,
+    'refund.processed': _refund_processed,
+}
+
+
+def record_event(event_id, payload):
+    """Queue a webhook delivery; returns the new PaymentEvent, or None if this event was already received."""
+    try:
+        with transaction.atomic():
+            return PaymentEvent.objects.create(
+                event_id=event_id,
+                event_type=payload.get('event', ''),
+                payload=payload,
+            )
+    except IntegrityError:
+        return None
+
+
+def process_event(event_id):
+    """
+    Apply one queued event. The event row is locked and skipped if another
+    worker holds it, so each event is handled once; a handler error rolls
+    back what it did and leaves the event pending until MAX_EVENT_ATTEMPTS.
+    """
+    with transaction.atomic():
+        event = (
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(id=event_id, status='pending')
+            .first()
+        )
+        if event is None:
+            return
+        handler = EVENT_HANDLERS.get(event.event_type)
+        try:
+            with transaction.atomic():
+                if handler:
+                    handler(event.payload['payload'])
+            event.status = 'processed'
+            event.error = ''
+        except Exception as e:
+            event.attempts += 1
+            event.error = str(e)
+            if event.attempts >= MAX_EVENT_ATTEMPTS:
+                event.status = 'failed'
+        event.processed_at = timezone.now()
+        event.save()
+
+
+def process_pending_events(limit=500):
+    """Retry queued events oldest first; returns how many were looked at."""
+    event_ids = list(PaymentEvent.objects.filter(status='pending').values_list('id', flat=True)[:limit])
+    for event_id in event_ids:
+        process_event(event_id)
+    return len(event_ids)
+
+
+def reconcile_pending_orders(now=None):
+    """
+    Capture unpaid online orders whose payment went through but whose
+    callback and webhook never arrived. Payments are fetched from the gateway
+    in pages covering the whole window instead of one request per order.
+    Returns the ids of the orders captured.
+    """
+    now = now or timezone.now()
+    stale = dict(
+        Order.objects.filter(
+            payment_method='online',
+            is_paid=False,
+            order_status='pending',
+            razorpay_order_id__isnull=False,
+            created_at__lt=now - RECONCILE_AFTER,
+            created_at__gte=now - RECONCILE_WINDOW,
+        ).values_list('razorpay_order_id', 'id')
+    )
+    if not stale:
+        return []
+
+    captured = {}
+    for payment in get_gateway().fetch_payments(now - RECONCILE_WINDOW):
+        if payment['status'] == 'captured' and payment['order_id'] in stale:
+            captured[stale[payment['order_id']]] = payment['id']
+
+    captured_ids = []
+    for order in Order.objects.filter(id__in=captured.keys()):
+        try:
+            if capture_order(order, captured[order.id]):
+                captured_ids.append(order.id)
+        except OutOfStock:
+            pass  # cancelled and refunded by capture_order
+    return captured_ids
+
+
+def _restore_carts(order_ids):
+    """Put the items of these orders back in their owners' carts, keeping lines already there; returns the lines offered."""
+    lines = {}
+    for user_id, variant_id, quantity in OrderItem.objects.filter(
+        order_id__in=order_ids, variant__isnull=False, is_cancelled=False,
+    ).values_list('order__user_id', 'variant_id', 'quantity'):
+        lines[user_id, variant_id] = lines.get((user_id, variant_id), 0) + quantity
+    if not lines:
+        return 0
+
+    user_ids = {user_id for user_id, _ in lines}
+    Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+    carts = dict(Cart.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+    CartItem.objects.bulk_create([
+        CartItem(cart_id=carts[user_id], variant_id=variant_id, quantity=quantity)
+        for (user_id, variant_id), quantity in lines.items()
+    ], ignore_conflicts=True)
+    for user_id in user_ids:
+        transaction.on_commit(partial(reset_cart_count, user_id))
+    return len(lines)
+
+
+def reap_abandoned_orders(now=None, batch_size=500, restore_cart=False):
+    """
+    Cancel unpaid online orders older than ABANDONED_AFTER, batch_size at a
+    time: each batch is locked (skipping rows another worker holds), marked
+    failed and cancelled with bulk UPDATEs, and its reserved stock and
+    redeemed coupons released. With restore_cart the items go back into the
+    users' carts. Returns counts of orders, released stock lines, released
+    coupons and restored cart lines.
+    """
+    now = now or timezone.now()
+    stats = {'orders': 0, 'stock_lines': 0, 'coupons': 0, 'cart_lines': 0}
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(
+                    payment_method='online',
+                    is_paid=False,
+                    order_status='pending',
+                    created_at__lt=now - ABANDONED_AFTER,
+                )
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            # update() skips the signals that keep the sales rollup current
+            mark_days({order_day(order) for order in Order.objects.filter(id__in=order_ids).only('created_at')})
+            Order.objects.filter(id__in=order_ids).update(
+                order_status='cancelled',
+                payment_status='failed',
+                cancellation_reason='Payment not completed',
+                cancelled_at=now,
+                updated_at=now,
+            )
+            stats['stock_lines'] += release_reservations(order_ids)
+            stats['coupons'] += release_coupons(
+                Order.objects.filter(id__in=order_ids, coupon_code__isnull=False).values_list('user_id', 'coupon_code')
+            )
+            if restore_cart:
+                stats['cart_lines'] += _restore_carts(order_ids)
+            OrderItem.objects.filter(order_id__in=order_ids, is_cancelled=False).update(
+                is_cancelled=True, item_status='cancelled', cancelled_at=now,
+            )
+            stats['orders'] += len(order_ids)
+        if len(order_ids) < batch_size:
+            break
+
+    logger.info(
+        f"Reaped {stats['orders']} abandoned order(s): released {stats['stock_lines']} stock line(s) "
+        f"and {stats['coupons']} coupon(s), restored {stats['cart_lines']} cart line(s)"
+    )
+    return stats
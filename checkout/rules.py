@@ -0,0 +1,94 @@
+# checkout/rules.py
+from decimal import Decimal
+from django.core.cache import cache
+from .models import DeliveryRule
+
+RULES_VERSION_KEY = 'delivery_rules:version'
+
+# Terms used when no default rule is configured
+FALLBACK_RULE = DeliveryRule(
+    delivery_fee=Decimal('40'), free_delivery_above=Decimal('500'), cod_limit=Decimal('1000'),
+)
+
+
+class DeliveryRules:
+    """
+    The active DeliveryRule rows compiled into lookup tables, so working out
+    a fee or a payment method for an address is a few dict lookups.
+    """
+
+    def __init__(self, rules):
+        self.by_pincode = {}
+        self.by_state = {}
+        self.default = FALLBACK_RULE
+        for rule in rules:
+            if rule.pincode_prefix:
+                self.by_pincode[rule.pincode_prefix] = rule
+            elif rule.state:
+                self.by_state[rule.state] = rule
+            else:
+                self.default = rule
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.by_pincode}, reverse=True)
+
+    def rule_for(self, address):
+        if address is None:
+            return self.default
+        pincode = address.pincode.strip()
+        for length in self.prefix_lengths:
+            rule = self.by_pincode.get(pincode[:length])
+            if rule:
+                return rule
+        return self.by_state.get(address.state, self.default)
+
+    def delivery_charge(self, subtotal, address):
+        rule = self.rule_for(address)
+        if rule.free_delivery_above is not None and subtotal >= rule.free_delivery_above:
+            return Decimal('0')
+        return rule.delivery_fee
+
+    def free_delivery_gap(self, subtotal, address):
+        """How much more the cart needs for free delivery: 0 once it is free, None where it never is."""
+        rule = self.rule_for(address)
+        if rule.free_delivery_above is None:
+            return None
+        return max(Decimal('0'), rule.free_delivery_above - subtotal)
+
+    def allows(self, payment_method, total, address):
+        rule = self.rule_for(address)
+        if payment_method == 'cod':
+            return rule.allow_cod and (rule.cod_limit is None or total <= rule.cod_limit)
+        return getattr(rule, f'allow_{payment_method}', False)
+
+    def refusal(self, payment_method, address):
+        """Why allows() said no, to follow "Not available ..."."""
+        rule = self.rule_for(address)
+        if payment_method == 'cod' and rule.allow_cod:
+            return f'for orders above ₹{rule.cod_limit}'
+        return 'for this delivery address'
+
+
+def rules_version():
+    return cache.get_or_set(RULES_VERSION_KEY, 1, None)
+
+
+def bump_rules_version():
+    """Make every process recompile its rules on the next lookup."""
+    try:
+        cache.incr(RULES_VERSION_KEY)
+    except ValueError:
+        cache.set(RULES_VERSION_KEY, 2, None)
+
+
+_compiled = {'version': None, 'rules': None}
+
+
+def get_delivery_rules():
+    """
+    The compiled rules, kept per process and rebuilt only when the shared
+    version moves, so the only cost per request is one cache read.
+    """
+    version = rules_version()
+    if _compiled['version'] != version:
+        _compiled['rules'] = DeliveryRules(DeliveryRule.objects.filter(is_active=True))
+        _compiled['version'] = version
+    return _compiled['rules']
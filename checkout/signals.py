@@ -0,0 +1,13 @@
+# checkout/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import DeliveryRule
+from .rules import bump_rules_version
+
+
+@receiver(post_save, sender=DeliveryRule)
+@receiver(post_delete, sender=DeliveryRule)
+def delivery_rule_changed(sender, **kwargs):
+    # After commit, so no process recompiles from rows that are not visible yet
+    transaction.on_commit(bump_rules_version)
@@ -0,0 +1,181 @@
+# checkout/snapshot.py
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from cart.totals import CartTotals
+from coupons.utils import calculate_discount, get_active_coupon, is_valid_at
+from products.cache import catalog_timeout, catalog_version
+from .rules import get_delivery_rules, rules_version
+
+SESSION_KEY = 'checkout_snapshot'
+
+
+def checkout_stamp(cart, address):
+    """
+    A fingerprint of the cart's lines, the delivery address and the catalog
+    and delivery rule versions, from one aggregate query. Adding, removing or
+    changing a line, editing or switching the address, or any change to
+    prices, offers, listings or delivery rules gives a new stamp.
+    """
+    summary = cart.items.aggregate(
+        lines=Count('id'), ids=Sum('id'), units=Sum('quantity'), changed=Max('updated_at'),
+    )
+    changed = summary['changed'].isoformat() if summary['changed'] else ''
+    destination = f"{address.id}@{address.updated_at.isoformat()}" if address else ''
+    return (
+        f"{catalog_version()}:{rules_version()}:{destination}:"
+        f"{summary['lines']}:{summary['ids'] or 0}:{summary['units'] or 0}:{changed}"
+    )
+
+
+class SnapshotLine:
+    """One priced cart line, holding what place_order writes into the order item."""
+
+    def __init__(self, id, variant_id, quantity, product_name, color_name, color_code,
+                 final_price, item_subtotal, stock_available, is_available):
+        self.id = id
+        self.variant_id = variant_id
+        self.quantity = quantity
+        self.product_name = product_name
+        self.color_name = color_name
+        self.color_code = color_code
+        self.final_price = Decimal(final_price)
+        self.item_subtotal = Decimal(item_subtotal)
+        self.stock_available = stock_available
+        self.is_available = is_available
+
+    def to_session(self):
+        return {
+            **vars(self),
+            'final_price': str(self.final_price),
+            'item_subtotal': str(self.item_subtotal),
+        }
+
+
+class CheckoutSnapshot:
+    """
+    The priced cart frozen in the session between the checkout page, the
+    coupon views and place_order, so they stop repricing every line. It is
+    only trusted while the cart stamp matches and no offer in it has run out.
+    """
+
+    def __init__(self, stamp, expires_at, items, subtotal, original_total, discount, has_offer, delivery_charge):
+        self.stamp = stamp
+        self.expires_at = expires_at
+        self.items = items
+        self.subtotal = subtotal
+        self.original_total = original_total
+        self.discount = discount
+        self.has_offer = has_offer
+        self.delivery_charge = delivery_charge
+
+    @classmethod
+    def from_totals(cls, totals, stamp, address):
+        variants = [item.variant for item in totals.items]
+        return cls(
+            stamp=stamp,
+            expires_at=timezone.now() + timedelta(seconds=catalog_timeout(variants)),
+            items=[
+                SnapshotLine(
+                    id=item.id,
+                    variant_id=item.variant_id,
+                    quantity=item.quantity,
+                    product_name=item.variant.product.name,
+                    color_name=item.variant.color_name,
+                    color_code=item.variant.color_code,
+                    final_price=item.final_price,
+                    item_subtotal=item.item_subtotal,
+                    stock_available=item.stock_available,
+                    is_available=item.is_available,
+                )
+                for item in totals.items
+            ],
+            subtotal=totals.subtotal,
+            original_total=totals.original_total,
+            discount=totals.discount,
+            has_offer=totals.has_offer,
+            delivery_charge=get_delivery_rules().delivery_charge(totals.subtotal, address),
+        )
+
+    @classmethod
+    def from_session(cls, data):
+        return cls(
+            stamp=data['stamp'],
+            expires_at=datetime.fromisoformat(data['expires_at']),
+            items=[SnapshotLine(**line) for line in data['items']],
+            subtotal=Decimal(data['subtotal']),
+            original_total=Decimal(data['original_total']),
+            discount=Decimal(data['discount']),
+            has_offer=data['has_offer'],
+            delivery_charge=Decimal(data['delivery_charge']),
+        )
+
+    def to_session(self):
+        return {
+            'stamp': self.stamp,
+            'expires_at': self.expires_at.isoformat(),
+            'items': [line.to_session() for line in self.items],
+            'subtotal': str(self.subtotal),
+            'original_total': str(self.original_total),
+            'discount': str(self.discount),
+            'has_offer': self.has_offer,
+            'delivery_charge': str(self.delivery_charge),
+        }
+
+    @property
+    def is_empty(self):
+        return not self.items
+
+    @property
+    def has_out_of_stock(self):
+        return any(not line.stock_available for line in self.items)
+
+    @property
+    def has_unlisted(self):
+        return any(not line.is_available for line in self.items)
+
+
+def _reprice_coupon(request, snapshot):
+    """Work the applied coupon's discount out again for a new snapshot, dropping it if it no longer applies."""
+    code = request.session.get('coupon_code')
+    if not code:
+        return
+    coupon = get_active_coupon(code)
+    discount = None
+    if coupon and is_valid_at(coupon, timezone.now()):
+        discount = calculate_discount(coupon, snapshot.subtotal, snapshot.delivery_charge)
+    if discount is None:
+        request.session.pop('coupon_code', None)
+        request.session.pop('coupon_discount', None)
+        request.session.pop('coupon_id', None)
+    else:
+        request.session['coupon_discount'] = str(discount)
+
+
+def save_snapshot(request, totals, stamp, address):
+    """
+    Store a snapshot of freshly priced totals. Take the stamp before pricing,
+    so a cart that changes in between leaves a stale stamp, not stale prices.
+    """
+    snapshot = CheckoutSnapshot.from_totals(totals, stamp, address)
+    previous = request.session.get(SESSION_KEY) or {}
+    if (previous.get('subtotal'), previous.get('delivery_charge')) != (str(snapshot.subtotal), str(snapshot.delivery_charge)):
+        _reprice_coupon(request, snapshot)
+    request.session[SESSION_KEY] = snapshot.to_session()
+    return snapshot
+
+
+def get_snapshot(request, cart, address):
+    """The checkout snapshot for this cart and address, repricing it only if the stamp moved on or an offer ran out."""
+    stamp = checkout_stamp(cart, address)
+    data = request.session.get(SESSION_KEY)
+    if data and data['stamp'] == stamp:
+        snapshot = CheckoutSnapshot.from_session(data)
+        if snapshot.expires_at > timezone.now():
+            return snapshot
+    return save_snapshot(request, CartTotals(cart), stamp, address)
+
+
+def clear_snapshot(request):
+    request.session.pop(SESSION_KEY, None)
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from products.models import Brand, Category, Product, ProductVariant
+from wallet.models import Wallet
+from .gateway import SignatureVerificationError, StubGateway, get_gateway
+from .models import PaymentEvent
+from .payments import MAX_EVENT_ATTEMPTS, RECONCILE_AFTER, process_event, reconcile_pending_orders, record_event
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(
+    PAYMENT_GATEWAY='checkout.gateway.StubGateway',
+    RAZORPAY_KEY_ID='rzp_test_stub',
+    RAZORPAY_KEY_SECRET='stub-secret',
+    RAZORPAY_WEBHOOK_SECRET='stub-webhook-secret',
+)
+class StubGatewayTestCase(TestCase):
+    """Runs against a fresh StubGateway, so nothing here talks to Razorpay."""
+
+    def setUp(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+        self.gateway = get_gateway()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+
+    def make_order(self, **fields):
+        return Order.objects.create(
+            user=self.user,
+            subtotal=Decimal('500'),
+            total_amount=Decimal('500'),
+            payment_method='online',
+            order_status='pending',
+            **fields
+        )
+
+    def make_variant(self, stock):
+        product = Product.objects.create(
+            name=f"Phone {ProductVariant.objects.count() + 1}", description='A phone',
+            category=Category.objects.create(name='Phones'), brand=Brand.objects.create(name='Acme'),
+        )
+        return ProductVariant.objects.create(product=product, color_name='Black', stock=stock, price=Decimal('500'))
+
+    def sold_out_order(self):
+        """An unpaid order whose reservation lapsed and whose only variant has since sold out."""
+        order = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+        variant = self.make_variant(stock=0)
+        OrderItem.objects.create(
+            order=order, variant=variant, product_name=variant.product.name,
+            color_name=variant.color_name, color_code=variant.color_code, price=Decimal('500'), quantity=1,
+        )
+        return order
+
+    def assertRefunded(self, order):
+        order.refresh_from_db()
+        self.assertFalse(order.is_paid)
+        self.assertEqual(order.order_status, 'cancelled')
+        self.assertEqual(order.payment_status, 'refunded')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, order.total_amount)
+        self.assertFalse(order.items.filter(is_cancelled=False).exists())
+
+
+class GatewayTests(StubGatewayTestCase):
+
+    def test_settings_pick_the_stub(self):
+        self.assertIsInstance(self.gateway, StubGateway)
+        self.assertEqual(self.gateway.key_id, 'rzp_test_stub')
+
+    def test_create_order_returns_a_new_id_each_time(self):
+        first = self.gateway.create_order(50000, {'order_id': 1})
+        second = self.gateway.create_order(50000, {'order_id': 2})
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.gateway.orders[first]['amount'], 50000)
+        self.assertEqual(self.gateway.orders[first]['notes'], {'order_id': 1})
+
+    def test_payment_signature(self):
+        razorpay_order_id = self.gateway.create_order(50000, {})
+        callback = self.gateway.pay(razorpay_order_id)
+        self.gateway.verify_payment_signature(**callback)
+        with self.assertRaises(SignatureVerificationError):
+            self.gateway.verify_payment_signature(**{**callback, 'razorpay_signature': 'forged'})
+
+
+class RazorpayPaymentTests(StubGatewayTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_gateway_order_is_created_once(self):
+        order = self.make_order()
+        self.client.get(reverse('razorpay_payment', args=[order.id]))
+        order.refresh_from_db()
+        self.assertIn(order.razorpay_order_id, self.gateway.orders)
+        self.assertEqual(self.gateway.orders[order.razorpay_order_id]['amount'], 50000)
+
+        # A reload reuses the stored gateway order
+        self.client.get(reverse('razorpay_payment', args=[order.id]))
+        self.assertEqual(len(self.gateway.orders), 1)
+
+    def test_cancelled_order_is_refused(self):
+        order = self.make_order()
+        Order.objects.filter(id=order.id).update(order_status='cancelled')
+        response = self.client.get(reverse('razorpay_payment', args=[order.id]))
+        self.assertRedirects(
+            response, reverse('order_detail', args=[order.order_number]), fetch_redirect_response=False,
+        )
+        self.assertEqual(self.gateway.orders, {})
+
+
+class PaymentSuccessTests(StubGatewayTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+
+    def test_signed_callback_captures_the_order(self):
+        callback = self.gateway.pay(self.order.razorpay_order_id)
+        response = self.client.post(reverse('payment_success'), callback)
+        self.assertRedirects(
+            response, reverse('order_success', args=[self.order.id]), fetch_redirect_response=False,
+        )
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(self.order.payment_status, 'paid')
+        self.assertEqual(self.order.order_status, 'confirmed')
+        self.assertEqual(self.order.razorpay_payment_id, callback['razorpay_payment_id'])
+
+    def test_forged_signature_is_rejected(self):
+        callback = self.gateway.pay(self.order.razorpay_order_id)
+        response = self.client.post(reverse('payment_success'), {**callback, 'razorpay_signature': 'forged'})
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+        self.assertEqual(self.order.payment_status, 'pending')
+
+    def test_sold_out_callback_is_refunded(self):
+        order = self.sold_out_order()
+        response = self.client.post(reverse('payment_success'), self.gateway.pay(order.razorpay_order_id))
+        self.assertRedirects(
+            response, reverse('order_detail', args=[order.order_number]), fetch_redirect_response=False,
+        )
+        self.assertRefunded(order)
+
+    def test_repeated_callback_captures_once(self):
+        callback = self.gateway.pay(self.order.razorpay_order_id)
+        self.client.post(reverse('payment_success'), callback)
+        response = self.client.post(reverse('payment_success'), callback)
+        self.assertRedirects(
+            response, reverse('order_success', args=[self.order.id]), fetch_redirect_response=False,
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.razorpay_payment_id, callback['razorpay_payment_id'])
+
+
+def captured_event(razorpay_order_id, razorpay_payment_id):
+    return {
+        'event': 'payment.captured',
+        'payload': {'payment': {'entity': {'id': razorpay_payment_id, 'order_id': razorpay_order_id}}},
+    }
+
+
+class WebhookTests(StubGatewayTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+
+    def deliver(self, payload, event_id='evt_1', signature=None):
+        body = json.dumps(payload).encode()
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature or self.gateway.sign_webhook(body),
+            HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def test_captured_webhook_captures_the_order(self):
+        payment_id = self.gateway.pay(self.order.razorpay_order_id)['razorpay_payment_id']
+        self.assertEqual(self.deliver(captured_event(self.order.razorpay_order_id, payment_id)).status_code, 200)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(PaymentEvent.objects.get().status, 'processed')
+
+    def test_duplicate_event_id_is_recorded_once(self):
+        payment_id = self.gateway.pay(self.order.razorpay_order_id)['razorpay_payment_id']
+        payload = captured_event(self.order.razorpay_order_id, payment_id)
+        self.assertIsNotNone(record_event('evt_dup', payload))
+        self.assertIsNone(record_event('evt_dup', payload))
+
+        # Redelivered over HTTP, the duplicate is acknowledged and dropped
+        self.deliver(payload, event_id='evt_http')
+        self.assertEqual(self.deliver(payload, event_id='evt_http').status_code, 200)
+        self.assertEqual(PaymentEvent.objects.filter(event_id='evt_http').count(), 1)
+
+    def test_sold_out_capture_is_refunded(self):
+        order = self.sold_out_order()
+        payment_id = self.gateway.pay(order.razorpay_order_id)['razorpay_payment_id']
+        self.deliver(captured_event(order.razorpay_order_id, payment_id))
+        self.assertRefunded(order)
+        self.assertEqual(order.razorpay_payment_id, payment_id)
+
+        # A redelivery under a new event id does not refund twice
+        self.deliver(captured_event(order.razorpay_order_id, payment_id), event_id='evt_2')
+        self.assertRefunded(order)
+
+    def test_unsigned_webhook_is_rejected(self):
+        payload = captured_event(self.order.razorpay_order_id, 'pay_forged')
+        self.assertEqual(self.deliver(payload, signature='forged').status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_failing_handler_is_parked_after_max_attempts(self):
+        # A payment.captured event without a payment entity makes the handler raise
+        event = record_event('evt_broken', {'event': 'payment.captured', 'payload': {}})
+        for attempt in range(1, MAX_EVENT_ATTEMPTS):
+            process_event(event.id)
+            event.refresh_from_db()
+            self.assertEqual(event.status, 'pending')
+            self.assertEqual(event.attempts, attempt)
+
+        process_event(event.id)
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'failed')
+        self.assertEqual(event.attempts, MAX_EVENT_ATTEMPTS)
+        self.assertTrue(event.error)
+
+        # A parked event is no longer picked up
+        process_event(event.id)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, MAX_EVENT_ATTEMPTS)
+
+
+class ReconcileTests(StubGatewayTestCase):
+
+    def test_captured_payment_without_callback_is_captured(self):
+        paid = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+        unpaid = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+        payment_id = self.gateway.pay(paid.razorpay_order_id)['razorpay_payment_id']
+        self.gateway.pay(unpaid.razorpay_order_id, status='failed')
+
+        later = timezone.now() + RECONCILE_AFTER + timedelta(minutes=1)
+        self.assertEqual(reconcile_pending_orders(now=later), [paid.id])
+        paid.refresh_from_db()
+        unpaid.refresh_from_db()
+        self.assertTrue(paid.is_paid)
+        self.assertEqual(paid.razorpay_payment_id, payment_id)
+        self.assertFalse(unpaid.is_paid)
+
+        # Already captured, so a second run has nothing to do
+        self.assertEqual(reconcile_pending_orders(now=later), [])
+
+    def test_recent_orders_are_left_to_the_callback(self):
+        order = self.make_order(razorpay_order_id=self.gateway.create_order(50000, {}))
+        self.gateway.pay(order.razorpay_order_id)
+        self.assertEqual(reconcile_pending_orders(), [])
+        order.refresh_from_db()
+        self.assertFalse(order.is_paid)
+
+    def test_sold_out_order_is_refunded(self):
+        order = self.sold_out_order()
+        self.gateway.pay(order.razorpay_order_id)
+        later = timezone.now() + RECONCILE_AFTER + timedelta(minutes=1)
+        self.assertEqual(reconcile_pending_orders(now=later), [])
+        self.assertRefunded(order)
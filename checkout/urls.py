@@ -8,6 +8,7 @@ urlpatterns = [
     path('place-order/', views.place_order, name='place_order'),
     path('razorpay-payment/<int:order_id>/', views.razorpay_payment, name='razorpay_payment'),
     path('payment-success/', views.payment_success, name='payment_success'),
+    path('razorpay-webhook/', views.razorpay_webhook, name='razorpay_webhook'),
     path('payment-failed/', views.payment_failed, name='payment_failed'),
     path('retry-payment/<int:order_id>/', views.retry_payment, name='retry_payment'),
     path('order-success/<int:order_id>/', views.order_success, name='order_success'),
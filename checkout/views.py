@@ -1,76 +1,55 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from decimal import Decimal
+from functools import partial
+import hashlib
+import json
+import logging
+import uuid
 from django.db import models
+from django.db.models import F
 from cart.models import Cart
+from cart.utils import reset_cart_count
+from cart.totals import CartTotals
 from profiles.utils import get_user_addresses, get_default_address
 from profiles.models import Address
-from orders.models import Order, OrderItem, OrderAddress
+from orders.models import Order
+from orders.assembly import INITIAL_STATUS, assemble_order
+from .models import CheckoutSubmission
+from orders.stock import RESERVATION_TTL, OutOfStock, reserve_stock, take_stock
 from wallet.models import Wallet, WalletTransaction
-from coupons.models import Coupon, CouponUsage
-from offers.utils import get_offer_details
-import razorpay
+from coupons.models import CouponUsage
+from coupons.utils import CouponUnavailable, available_coupons, calculate_discount, get_active_coupon, is_exhausted, redeem_coupon
+from offers.utils import get_offer_prices
+from .gateway import SignatureVerificationError, get_gateway
+from .rules import get_delivery_rules
+from .snapshot import checkout_stamp, clear_snapshot, get_snapshot, save_snapshot
+from .payments import capture_order, process_event, record_event
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 
 def checkout(request):
     cart, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = (
-        cart.items
-        .select_related('variant__product__brand', 'variant__product__category')
-        .prefetch_related('variant__images')
-        .all()
-    )
-
-    for item in cart_items:
-        item.first_image = item.variant.images.first()
-
     addresses = get_user_addresses(request.user)
     default_address = get_default_address(request.user)
 
-    wallet, _ = Wallet.objects.get_or_create(user=request.user)
-
-    subtotal_before_offer = Decimal('0')
-    subtotal_after_offer = Decimal('0')
-    total_offer_discount = Decimal('0')
-    has_offer = False
-
-    for item in cart_items:
-        base_price = item.variant.price
-        quantity = item.quantity
-
-        final_price, discount_percentage, offer_type = get_offer_details(
-            item.variant.product, 
-            base_price
-        )
-
-        item_subtotal_before = base_price * quantity
-        item_subtotal_after = final_price * quantity
-        item_offer_discount = item_subtotal_before - item_subtotal_after
-        
-        item.base_price = base_price
-        item.final_price = final_price
-        item.offer_discount_percentage = discount_percentage
-        item.offer_type = offer_type
-        item.item_offer_discount = item_offer_discount
-        item.subtotal_before_offer = item_subtotal_before
-        item.subtotal_after_offer = item_subtotal_after
-
-        subtotal_before_offer += item_subtotal_before
-        subtotal_after_offer += item_subtotal_after
+    stamp = checkout_stamp(cart, default_address)
+    totals = CartTotals(cart, images=True)
+    snapshot = save_snapshot(request, totals, stamp, default_address)
+    rules = get_delivery_rules()
 
-        if discount_percentage > 0:
-            has_offer = True
-            total_offer_discount += item_offer_discount
+    wallet, _ = Wallet.objects.get_or_create(user=request.user)
 
-    subtotal = subtotal_after_offer
-    delivery_charge = Decimal('0') if subtotal >= 500 else Decimal('40')
-    free_delivery = max(Decimal('0'), Decimal('500') - subtotal)
+    subtotal = totals.subtotal
+    delivery_charge = snapshot.delivery_charge
+    free_delivery = rules.free_delivery_gap(subtotal, default_address)
 
     coupon_discount = Decimal(request.session.get('coupon_discount', '0'))
     coupon_code = request.session.get('coupon_code', None)
@@ -78,36 +57,31 @@ def checkout(request):
     total_before_discount = subtotal + delivery_charge
     total = total_before_discount - coupon_discount
 
-    now = timezone.now()
-    used_coupon_ids = CouponUsage.objects.filter(user=request.user).values_list('coupon_id', flat=True)
-    available_coupons = Coupon.objects.filter(
-        is_active=True,
-        valid_from__lte=now
-    ).filter(
-        models.Q(valid_until__isnull=True) | models.Q(valid_until__gte=now)
-    ).exclude(
-        id__in=used_coupon_ids
-    ).order_by('-discount_percentage')
-    
     context = {
         'cart': cart,
-        'cart_items': cart_items,
+        'cart_items': totals.items,
         'addresses': addresses,
         'default_address': default_address,
         'wallet': wallet,
-        'subtotal_before_offer': subtotal_before_offer,
+        'subtotal_before_offer': totals.original_total,
         'subtotal': round(subtotal, 2),
-        'total_offer_discount': round(total_offer_discount, 2),
+        'total_offer_discount': round(totals.discount, 2),
         'delivery_charge': delivery_charge,
         'total': round(total, 2),
         'total_before_discount': total_before_discount,
         'coupon_discount': coupon_discount,
         'coupon_code': coupon_code,
-        'free_delivery': round(free_delivery, 2),
+        'free_delivery': free_delivery if free_delivery is None else round(free_delivery, 2),
         'razorpay_key_id': settings.RAZORPAY_KEY_ID,
-        'has_offer': has_offer,
-        'available_coupons': available_coupons,
-        'cod_disabled': total > 1000,  
+        'has_offer': totals.has_offer,
+        'available_coupons': available_coupons(request.user),
+        'cod_disabled': not rules.allows('cod', total, default_address),
+        'cod_note': rules.refusal('cod', default_address),
+        'online_disabled': not rules.allows('online', total, default_address),
+        'online_note': rules.refusal('online', default_address),
+        'wallet_disabled': not rules.allows('wallet', total, default_address),
+        'wallet_note': rules.refusal('wallet', default_address),
+        'checkout_key': uuid.uuid4().hex,
     }
     return render(request, 'user_side/checkout/checkout.html', context)
 
@@ -121,16 +95,11 @@ def apply_coupon(request):
     
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related(
-            'variant__product__brand'
-        ).prefetch_related('variant__product__product_offer', 'variant__product__brand__brand_offer').all()
         
         now = timezone.now()
-        coupon = Coupon.objects.get(
-            code=coupon_code,
-            is_active=True,
-            valid_from__lte=now
-        )
+        coupon = get_active_coupon(coupon_code)
+        if coupon is None or coupon.valid_from > now:
+            return JsonResponse({'success': False, 'message': 'Invalid coupon code'})
         
         if coupon.valid_until and coupon.valid_until < now:
             return JsonResponse({'success': False, 'message': 'This coupon has expired'})
@@ -138,29 +107,21 @@ def apply_coupon(request):
         if CouponUsage.objects.filter(user=request.user, coupon=coupon).exists():
             return JsonResponse({'success': False, 'message': 'You have already used this coupon'})
 
-        if coupon.usage_limit > 0:
-            usage_count = CouponUsage.objects.filter(coupon=coupon).count()
-            if usage_count >= coupon.usage_limit:
-                return JsonResponse({'success': False, 'message': 'This coupon has reached its usage limit'})
+        # Only a hint from the cached counter; redeem_coupon enforces the limit when the order is placed
+        if is_exhausted(coupon):
+            return JsonResponse({'success': False, 'message': 'This coupon has reached its usage limit'})
         
-        offer_adjusted_subtotal = Decimal('0')
-        for item in cart_items:
-            final_price, _, _ = get_offer_details(item.variant.product, item.variant.price)
-            offer_adjusted_subtotal += final_price * item.quantity
+        address = get_default_address(request.user)
+        snapshot = get_snapshot(request, cart, address)
+        delivery_charge = snapshot.delivery_charge
+        total_before_discount = snapshot.subtotal + delivery_charge
 
-        delivery_charge = Decimal('0') if offer_adjusted_subtotal >= 500 else Decimal('40')
-        total_before_discount = offer_adjusted_subtotal + delivery_charge
-
-        if offer_adjusted_subtotal < coupon.min_purchase_amount:
+        discount_amount = calculate_discount(coupon, snapshot.subtotal, delivery_charge)
+        if discount_amount is None:
             return JsonResponse({
                 'success': False, 
                 'message': f'Minimum purchase of ₹{coupon.min_purchase_amount} required for this coupon'
             })
-        discount_amount = (total_before_discount * Decimal(coupon.discount_percentage)) / Decimal('100')
-        if coupon.max_discount_amount and discount_amount > coupon.max_discount_amount:
-            discount_amount = coupon.max_discount_amount
-        discount_amount = min(discount_amount, total_before_discount)
-        discount_amount = max(discount_amount, Decimal('0'))
 
         request.session['coupon_code'] = coupon_code
         request.session['coupon_discount'] = str(round(discount_amount, 2))
@@ -175,11 +136,10 @@ def apply_coupon(request):
             'total_before_discount': str(round(total_before_discount, 2)),
             'delivery_charge': str(delivery_charge),
             'discount_percentage': coupon.discount_percentage,
-            
+            'cod_disabled': not get_delivery_rules().allows('cod', total, address),
+            'cod_note': get_delivery_rules().refusal('cod', address),
         })
         
-    except Coupon.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Invalid coupon code'})
     except Exception as e:
         import traceback
         print(f"Coupon application error: {str(e)}")
@@ -195,290 +155,161 @@ def remove_coupon(request):
         request.session.pop('coupon_id', None)
 
         cart = Cart.objects.get(user=request.user)
-        subtotal = Decimal('0')
-        for item in cart.items.select_related(
-            'variant__product__brand'
-        ).prefetch_related('variant__product__product_offer', 'variant__product__brand__brand_offer').all():
-            final_price, _, _ = get_offer_details(item.variant.product, item.variant.price)
-            subtotal += final_price * item.quantity
+        address = get_default_address(request.user)
+        snapshot = get_snapshot(request, cart, address)
         
-        delivery_charge = Decimal('0') if subtotal >= 500 else Decimal('40')
-        total = subtotal + delivery_charge
+        delivery_charge = snapshot.delivery_charge
+        total = snapshot.subtotal + delivery_charge
         
         return JsonResponse({
             'success': True,
             'message': 'Coupon removed successfully',
             'total': str(round(total, 2)),
             'delivery_charge': str(delivery_charge),
-            'cod_disabled': total > 1000,
+            'cod_disabled': not get_delivery_rules().allows('cod', total, address),
+            'cod_note': get_delivery_rules().refusal('cod', address),
         })
     except Exception as e:
         print(f"Coupon removal error: {str(e)}")
         return JsonResponse({'success': False, 'message': 'An error occurred'})
 
+def _placed_order_redirect(order):
+    if order.payment_method == 'online' and not order.is_paid:
+        return redirect('razorpay_payment', order_id=order.id)
+    return redirect('order_success', order_id=order.id)
+
+
 @require_POST
 @transaction.atomic
 def place_order(request):
     try:
         payment_method = request.POST.get('payment_method', 'cod')
+        if payment_method not in INITIAL_STATUS:
+            payment_method = 'cod'
+
+        # A repeat of a submission that already placed its order goes straight to it
+        checkout_key = request.POST.get('checkout_key', '')[:64]
+        if checkout_key:
+            submission = CheckoutSubmission.objects.select_related('order').filter(
+                user=request.user, key=checkout_key, order__isnull=False
+            ).first()
+            if submission:
+                return _placed_order_redirect(submission.order)
         
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('variant__product__brand').all()
+        default_address = get_default_address(request.user)
+        snapshot = get_snapshot(request, cart, default_address)
+        cart_items = snapshot.items
 
         if not cart_items:
             messages.error(request, 'Your cart is empty.')
             return redirect('checkout')
 
-        default_address = get_default_address(request.user)
         if not default_address:
             messages.error(request, 'Please add a delivery address.')
             return redirect('checkout')
 
-        subtotal = Decimal('0')
-        for item in cart_items:
-            final_price, _, _ = get_offer_details(item.variant.product, item.variant.price)
-            subtotal += final_price * item.quantity
-        
-        delivery_charge = Decimal('0') if subtotal >= 500 else Decimal('40')
+        subtotal = snapshot.subtotal
+        delivery_charge = snapshot.delivery_charge
 
         coupon_discount = Decimal(request.session.get('coupon_discount', '0'))
         coupon_id = request.session.get('coupon_id', None)
         
         total = subtotal + delivery_charge - coupon_discount
 
-        if payment_method == 'cod' and total > 1000:
-            messages.error(request, 'Cash on Delivery is not available for orders above ₹1000. Please choose another payment method.')
+        rules = get_delivery_rules()
+        if not rules.allows(payment_method, total, default_address):
+            method = dict(Order.PAYMENT_CHOICES)[payment_method]
+            messages.error(request, f'{method} is not available {rules.refusal(payment_method, default_address)}. Please choose another payment method.')
             return redirect('checkout')
 
         for cart_item in cart_items:
-            if cart_item.variant.stock < cart_item.quantity:
-                messages.error(request, f'Insufficient stock for {cart_item.variant.product.name}')
+            if not cart_item.stock_available:
+                messages.error(request, f'Insufficient stock for {cart_item.product_name}')
                 return redirect('checkout')
 
         if payment_method == 'wallet':
-            wallet = Wallet.objects.get(user=request.user)
-            
+            wallet = Wallet.objects.select_for_update().get(user=request.user)
             if wallet.balance < total:
                 messages.error(request, f'Insufficient wallet balance. Your balance: ₹{wallet.balance}, Required: ₹{total}')
                 return redirect('checkout')
 
-            order = Order.objects.create(
-                user=request.user,
-                address=default_address,
-                subtotal=subtotal,
-                delivery_charge=delivery_charge,
-                discount_amount=coupon_discount,
-                total_amount=total,
-                payment_method='wallet',
-                order_status='confirmed',
-                payment_status='paid',
-                is_paid=True
-            )
-
-            if coupon_id:
-                order.coupon_code = request.session.get('coupon_code')
-                order.coupon_discount = coupon_discount
-                order.save()
-
-                CouponUsage.objects.create(
-                    user=request.user,
-                    coupon_id=coupon_id
-                )
-            
- 
-            OrderAddress.objects.create(
-                order=order,
-                full_name=default_address.full_name,
-                phone_number=default_address.mobile_number,
-                flat_house=default_address.flat_house,
-                area_street=default_address.area_street,
-                landmark=default_address.landmark or '',
-                town_city=default_address.town_city,
-                state=default_address.state,
-                pincode=default_address.pincode
-            )
-            
-            for cart_item in cart_items:
-                variant = cart_item.variant
-
-                final_price, _, _ = get_offer_details(variant.product, variant.price)
-                
-                OrderItem.objects.create(
-                    order=order,
-                    variant=variant,
-                    product_name=variant.product.name,
-                    color_name=variant.color_name,
-                    color_code=variant.color_code,
-                    price=final_price,  
-                    quantity=cart_item.quantity
-                )
-                variant.stock -= cart_item.quantity
-                variant.save()
-            
-            wallet.balance -= total
-            wallet.save()
-
-            WalletTransaction.objects.create(
-                wallet=wallet,
-                order=order,
-                amount=total,
-                transaction_type='debit'
-            )
-            
-            cart.items.all().delete()
-            request.session.pop('coupon_code', None)
-            request.session.pop('coupon_discount', None)
-            request.session.pop('coupon_id', None)
-            
-            messages.success(request, 'Order placed successfully using wallet!')
-            return redirect('order_success', order_id=order.id)
-
-        if payment_method == 'online':
+        if checkout_key:
+            # A concurrent duplicate blocks on the unique key until the first one commits
             try:
-                order = Order.objects.create(
-                    user=request.user,
-                    address=default_address,
-                    subtotal=subtotal,
-                    delivery_charge=delivery_charge,
-                    discount_amount=coupon_discount,
-                    total_amount=total,
-                    payment_method=payment_method,
-                    order_status='pending',
-                    payment_status='pending',
-                    is_paid=False
-                )
-
-                if coupon_id:
-                    order.coupon_code = request.session.get('coupon_code')
-                    order.coupon_discount = coupon_discount
-                    order.save()
-
-                OrderAddress.objects.create(
-                    order=order,
-                    full_name=default_address.full_name,
-                    phone_number=default_address.mobile_number,
-                    flat_house=default_address.flat_house,
-                    area_street=default_address.area_street,
-                    landmark=default_address.landmark or '',
-                    town_city=default_address.town_city,
-                    state=default_address.state,
-                    pincode=default_address.pincode
-                )
-
-                for cart_item in cart_items:
-                    variant = cart_item.variant
-                    final_price, _, _ = get_offer_details(variant.product, variant.price)
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        variant=variant,
-                        product_name=variant.product.name,
-                        color_name=variant.color_name,
-                        color_code=variant.color_code,
-                        price=final_price, 
-                        quantity=cart_item.quantity
-                    )
-
-                cart.items.all().delete()
-
-                key_id = settings.RAZORPAY_KEY_ID.strip()
-                key_secret = settings.RAZORPAY_KEY_SECRET.strip()
-                razorpay_client = razorpay.Client(auth=(key_id, key_secret))
-                
-                amount_in_paise = int(total * 100)
-                razorpay_order = razorpay_client.order.create({
-                    'amount': amount_in_paise,
-                    'currency': 'INR',
-                    'payment_capture': '1',
-                    'notes': {
-                        'order_id': order.id,
-                    }
-                })
-                
-                order.razorpay_order_id = razorpay_order['id']
-                order.save()
-                
-                return redirect('razorpay_payment', order_id=order.id)
-                
-            except Exception as e:
-                print(f"Razorpay order creation failed: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
-                messages.error(request, 'Payment gateway error. Please try again.')
-                if 'order' in locals():
-                    order.delete()
+                with transaction.atomic():
+                    submission = CheckoutSubmission.objects.create(user=request.user, key=checkout_key)
+            except IntegrityError:
+                submission = CheckoutSubmission.objects.select_related('order').get(user=request.user, key=checkout_key)
+                if submission.order:
+                    return _placed_order_redirect(submission.order)
+                messages.error(request, 'This order is already being placed.')
                 return redirect('checkout')
 
-        order = Order.objects.create(
-            user=request.user,
-            address=default_address,
-            subtotal=subtotal,
-            delivery_charge=delivery_charge,
-            discount_amount=coupon_discount,
-            total_amount=total,
-            payment_method=payment_method,
-            order_status='confirmed',
-            payment_status='pending',
-            is_paid=False
+        order = assemble_order(
+            request.user, snapshot, default_address, payment_method, delivery_charge,
+            coupon_code=request.session.get('coupon_code') if coupon_id else None,
+            coupon_discount=coupon_discount,
         )
-        
+        if checkout_key:
+            submission.order = order
+            submission.save(update_fields=['order'])
 
         if coupon_id:
-            order.coupon_code = request.session.get('coupon_code')
-            order.coupon_discount = coupon_discount
-            order.save()
-            
-            CouponUsage.objects.create(
-                user=request.user,
-                coupon_id=coupon_id
-            )
-
-        OrderAddress.objects.create(
-            order=order,
-            full_name=default_address.full_name,
-            phone_number=default_address.mobile_number,
-            flat_house=default_address.flat_house,
-            area_street=default_address.area_street,
-            landmark=default_address.landmark or '',
-            town_city=default_address.town_city,
-            state=default_address.state,
-            pincode=default_address.pincode
-        )
+            redeem_coupon(request.user, coupon_id)
+        if payment_method == 'online':
+            reserve_stock(order, cart_items)
+        else:
+            take_stock(cart_items)
 
-        for cart_item in cart_items:
-            variant = cart_item.variant
-            final_price, _, _ = get_offer_details(variant.product, variant.price)
-            
-            OrderItem.objects.create(
-                order=order,
-                variant=variant,
-                product_name=variant.product.name,
-                color_name=variant.color_name,
-                color_code=variant.color_code,
-                price=final_price,
-                quantity=cart_item.quantity
-            )
-            variant.stock -= cart_item.quantity
-            variant.save()
-            
         cart.items.all().delete()
+        transaction.on_commit(partial(reset_cart_count, request.user.id))
         request.session.pop('coupon_code', None)
         request.session.pop('coupon_discount', None)
         request.session.pop('coupon_id', None)
-        
-        messages.success(request, 'Order placed successfully!')
+        clear_snapshot(request)
+
+        if payment_method == 'online':
+            # The gateway order is created by the payment page, after this transaction commits
+            return redirect('razorpay_payment', order_id=order.id)
+
+        if payment_method == 'wallet':
+            Wallet.objects.filter(id=wallet.id).update(balance=F('balance') - total)
+            WalletTransaction.objects.create(
+                wallet=wallet,
+                order=order,
+                amount=total,
+                transaction_type='debit'
+            )
+
+        if payment_method == 'wallet':
+            messages.success(request, 'Order placed successfully using wallet!')
+        else:
+            messages.success(request, 'Order placed successfully!')
         return redirect('order_success', order_id=order.id)
         
     except Cart.DoesNotExist:
         messages.error(request, 'Cart not found.')
         return redirect('checkout')
+    except OutOfStock as e:
+        # Someone else bought the last units after the check above; undo the half-made order
+        transaction.set_rollback(True)
+        messages.error(request, str(e))
+        return redirect('checkout')
+    except CouponUnavailable as e:
+        transaction.set_rollback(True)
+        request.session.pop('coupon_code', None)
+        request.session.pop('coupon_discount', None)
+        request.session.pop('coupon_id', None)
+        messages.error(request, f'{e} It has been removed from your order.')
+        return redirect('checkout')
     except Wallet.DoesNotExist:
         messages.error(request, 'Wallet not found.')
         return redirect('checkout')
-    except Exception as e:
-        import traceback
-        print(f"Order placement error: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        # Undo the half-made order and its submission, so a retry with the same key can go through
+        transaction.set_rollback(True)
+        logger.exception(f"Order placement failed for user {request.user.id}")
         messages.error(request, 'An error occurred while placing your order.')
         return redirect('checkout')
 
@@ -486,15 +317,36 @@ def place_order(request):
 def razorpay_payment(request, order_id=None):
     if order_id:
         order = get_object_or_404(Order, id=order_id, user=request.user)
-        razorpay_order_id = order.razorpay_order_id
         amount = order.total_amount
         amount_in_paise = int(amount * 100)
     else:
         messages.error(request, 'Invalid payment request.')
         return redirect('checkout')
-    
+
+    if order.is_paid:
+        return redirect('order_success', order_id=order.id)
+    if order.order_status == 'cancelled':
+        messages.error(request, 'This order was cancelled and can no longer be paid.')
+        return redirect('order_detail', order_number=order.order_number)
+
+    razorpay_order_id = order.razorpay_order_id
+    if not razorpay_order_id:
+        # No database transaction is open while the gateway is called
+        try:
+            razorpay_order_id = get_gateway().create_order(amount_in_paise, {'order_id': order.id})
+        except Exception:
+            logger.exception(f"Razorpay order creation failed for order {order.order_number}")
+            messages.error(request, 'Payment gateway error. Please retry from order details.')
+            return redirect('order_detail', order_number=order.order_number)
+
+        # A concurrent load of this page may have stored its own gateway order first; keep that one
+        unassigned = models.Q(razorpay_order_id__isnull=True) | models.Q(razorpay_order_id='')
+        if not Order.objects.filter(unassigned, id=order.id).update(razorpay_order_id=razorpay_order_id):
+            order.refresh_from_db(fields=['razorpay_order_id'])
+            razorpay_order_id = order.razorpay_order_id
+
     context = {
-        'razorpay_key_id': settings.RAZORPAY_KEY_ID.strip(),
+        'razorpay_key_id': get_gateway().key_id,
         'razorpay_order_id': razorpay_order_id,
         'amount': amount,
         'amount_in_paise': amount_in_paise,
@@ -513,47 +365,22 @@ def payment_success(request):
         razorpay_order_id = request.POST.get('razorpay_order_id')
         razorpay_signature = request.POST.get('razorpay_signature')
         
-        key_id = settings.RAZORPAY_KEY_ID.strip()
-        key_secret = settings.RAZORPAY_KEY_SECRET.strip()
-        razorpay_client = razorpay.Client(auth=(key_id, key_secret))
-        
-        params_dict = {
-            'razorpay_order_id': razorpay_order_id,
-            'razorpay_payment_id': razorpay_payment_id,
-            'razorpay_signature': razorpay_signature
-        }
-        
-        razorpay_client.utility.verify_payment_signature(params_dict)
+        get_gateway().verify_payment_signature(razorpay_order_id, razorpay_payment_id, razorpay_signature)
         
         order = Order.objects.get(razorpay_order_id=razorpay_order_id)
-
-        with transaction.atomic():
-            for item in order.items.all():
-                variant = item.variant
-                if variant.stock < item.quantity:
-                    messages.error(request, f'Sorry, {variant.product.name} went out of stock.')
-                    order.payment_status = 'failed'
-                    order.save()
-                    return redirect('order_detail', order_id=order.id)
-                
-                variant.stock -= item.quantity
-                variant.save()
-
-        if order.coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=order.coupon_code)
-                CouponUsage.objects.get_or_create(
-                    user=request.user,
-                    coupon=coupon
-                )
-            except Coupon.DoesNotExist:
-                pass
-        
-        order.payment_status = 'paid'
-        order.order_status = 'confirmed'
-        order.is_paid = True
-        order.razorpay_payment_id = razorpay_payment_id
-        order.save()
+        try:
+            # The payment.captured webhook may already have done this
+            if not capture_order(order, razorpay_payment_id):
+                order.refresh_from_db(fields=['order_status', 'payment_status'])
+                if order.order_status == 'cancelled':
+                    messages.error(request, 'This order was cancelled before your payment arrived. The amount has been refunded to your wallet.')
+                    return redirect('order_detail', order_number=order.order_number)
+                return redirect('order_success', order_id=order.id)
+        except OutOfStock as e:
+            # capture_order has cancelled the order and refunded the payment to the wallet
+            names = ', '.join(variant.product.name for variant in e.variants) or 'an item in your order'
+            messages.error(request, f'Sorry, {names} went out of stock. The amount has been refunded to your wallet.')
+            return redirect('order_detail', order_number=order.order_number)
 
         request.session.pop('coupon_code', None)
         request.session.pop('coupon_discount', None)
@@ -565,22 +392,42 @@ def payment_success(request):
     except Order.DoesNotExist:
         messages.error(request, 'Order not found for this payment.')
         return redirect('checkout')
-    except razorpay.errors.SignatureVerificationError:
+    except SignatureVerificationError:
         messages.error(request, 'Payment verification failed.')
         return redirect('checkout')
-    except Exception as e:
-        print(f"Payment verification failed: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception(f"Payment callback failed for gateway order {request.POST.get('razorpay_order_id')}")
         messages.error(request, 'Payment verification failed.')
         return redirect('checkout')
 
 
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Razorpay webhooks (payment.captured, payment.failed, refund.processed).
+    The event is queued before it is applied, redeliveries are dropped by
+    event id, and an event that fails here is retried by reconcile_payments.
+    """
+    try:
+        get_gateway().verify_webhook_signature(request.body, request.headers.get('X-Razorpay-Signature'))
+        payload = json.loads(request.body)
+    except (SignatureVerificationError, ValueError):
+        return HttpResponse(status=400)
+
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(request.body).hexdigest()
+    event = record_event(event_id, payload)
+    if event:
+        process_event(event.id)
+    return HttpResponse(status=200)
+
+
 def payment_failed(request):
     order_id = request.GET.get('order_id')
     if order_id:
         try:
             order = Order.objects.get(id=order_id, user=request.user)
+            # A later attempt on the same gateway order can still succeed, so the reservation is left to its TTL
             order.payment_status = 'failed'
             order.save()
             messages.error(request, 'Payment failed. You can retry from order details.')
@@ -598,33 +445,30 @@ def retry_payment(request, order_id):
     
     if order.payment_status == 'paid':
         messages.warning(request, 'This order is already paid.')
-        return redirect('order_detail', order_id=order.order_number)
+        return redirect('order_detail', order_number=order.order_number)
+    if order.order_status == 'cancelled':
+        messages.error(request, 'This order was cancelled and can no longer be paid.')
+        return redirect('order_detail', order_number=order.order_number)
 
     try:
-        key_id = settings.RAZORPAY_KEY_ID.strip()
-        key_secret = settings.RAZORPAY_KEY_SECRET.strip()
-        razorpay_client = razorpay.Client(auth=(key_id, key_secret))
-        
-        amount_in_paise = int(order.total_amount * 100)
-        razorpay_order = razorpay_client.order.create({
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'payment_capture': '1',
-            'notes': {
-                'order_id': order.id,
-                'retry': 'true'
-            }
-        })
-        
-        order.razorpay_order_id = razorpay_order['id']
-        order.save()
-        
+        # Hold the stock again for the new attempt, or extend what is still held
+        if not order.stock_reservations.update(expires_at=timezone.now() + RESERVATION_TTL):
+            reserve_stock(order, order.items.filter(is_cancelled=False))
+
+        # The payment page creates a fresh gateway order once this commits
+        order.razorpay_order_id = None
+        order.save(update_fields=['razorpay_order_id'])
+
         return redirect('razorpay_payment', order_id=order.id)
         
+    except OutOfStock as e:
+        transaction.set_rollback(True)
+        messages.error(request, str(e))
+        return redirect('order_detail', order_number=order.order_number)
     except Exception as e:
         print(f"Retry payment failed: {str(e)}")
         messages.error(request, 'Could not initiate retry. Please contact support.')
-        return redirect('order_detail', order_id=order.order_number)
+        return redirect('order_detail', order_number=order.order_number)
 
 def order_success(request, order_id):
     order = get_object_or_404(
@@ -634,6 +478,7 @@ def order_success(request, order_id):
         id=order_id,
         user=request.user
     )
+    prices = get_offer_prices(item.variant for item in order.items.all())
     for item in order.items.all():
         original_price = item.variant.price
         final_price = item.price
@@ -645,10 +490,7 @@ def order_success(request, order_id):
             discount_percentage = (
                 (discount_amount / original_price) * 100
             )
-            _, _, offer_type = get_offer_details(
-                item.variant.product,
-                original_price
-            )
+            _, _, offer_type = prices[item.variant.id]
         item.original_price = original_price
         item.discount_percentage = discount_percentage
         item.discount_amount = discount_amount * item.quantity
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 13:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_usages(apps, schema_editor):
+    Coupon = apps.get_model('coupons', 'Coupon')
+    CouponUsage = apps.get_model('coupons', 'CouponUsage')
+    usages = (
+        CouponUsage.objects.filter(coupon=OuterRef('pk'))
+        .order_by()
+        .values('coupon')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Coupon.objects.update(times_used=Coalesce(Subquery(usages), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0003_remove_coupon_usage_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='times_used',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_usages, migrations.RunPython.noop),
+    ]
@@ -13,6 +13,8 @@ class Coupon(models.Model):
     valid_from = models.DateTimeField(default=timezone.now)
     valid_until = models.DateTimeField(null=True, blank=True)
     usage_limit = models.PositiveIntegerField(default=0)              
+    # CouponUsage rows for this coupon, kept in step by coupons.utils.redeem_coupon / release_coupons
+    times_used = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
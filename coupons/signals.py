@@ -0,0 +1,11 @@
+# coupons/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Coupon
+from .utils import forget_active_coupons
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, **kwargs):
+    forget_active_coupons()
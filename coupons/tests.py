@@ -1,3 +1,94 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from .models import Coupon, CouponUsage
+from .utils import CouponUnavailable, redeem_coupon, release_coupons
 
-# Create your tests here.
+User = get_user_model()
+
+
+class RedeemCouponTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='secret')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='secret')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com', password='secret')
+        self.coupon = Coupon.objects.create(code='SAVE10', usage_limit=2)
+
+    def assertUsed(self, times):
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, times)
+        self.assertEqual(CouponUsage.objects.filter(coupon=self.coupon).count(), times)
+
+    def test_redemptions_stop_at_the_limit(self):
+        redeem_coupon(self.alice, self.coupon.id)
+        redeem_coupon(self.bob, self.coupon.id)
+        with self.assertRaisesMessage(CouponUnavailable, 'no longer available'):
+            redeem_coupon(self.carol, self.coupon.id)
+        self.assertUsed(2)
+        self.assertFalse(CouponUsage.objects.filter(user=self.carol).exists())
+
+    def test_unlimited_coupon(self):
+        self.coupon.usage_limit = 0
+        self.coupon.save(update_fields=['usage_limit'])
+        for user in (self.alice, self.bob, self.carol):
+            redeem_coupon(user, self.coupon.id)
+        self.assertUsed(3)
+
+    def test_second_use_by_the_same_user_is_refused(self):
+        redeem_coupon(self.alice, self.coupon.id)
+        with self.assertRaisesMessage(CouponUnavailable, 'already used'):
+            redeem_coupon(self.alice, self.coupon.id)
+        # The refused use doesn't count against the limit
+        self.assertUsed(1)
+
+    def test_expired_and_inactive_coupons_are_refused(self):
+        self.coupon.valid_until = timezone.now() - timedelta(days=1)
+        self.coupon.save(update_fields=['valid_until'])
+        with self.assertRaises(CouponUnavailable):
+            redeem_coupon(self.alice, self.coupon.id)
+
+        self.coupon.valid_until = None
+        self.coupon.is_active = False
+        self.coupon.save(update_fields=['valid_until', 'is_active'])
+        with self.assertRaises(CouponUnavailable):
+            redeem_coupon(self.alice, self.coupon.id)
+        self.assertUsed(0)
+
+
+class ReleaseCouponsTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='secret')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='secret')
+        self.coupon = Coupon.objects.create(code='SAVE10', usage_limit=2)
+        self.other = Coupon.objects.create(code='SAVE20', usage_limit=0)
+
+    def test_release_counts_back_down(self):
+        redeem_coupon(self.alice, self.coupon.id)
+        redeem_coupon(self.bob, self.coupon.id)
+        redeem_coupon(self.alice, self.other.id)
+
+        self.assertEqual(release_coupons([(self.alice.id, 'SAVE10'), (self.alice.id, 'SAVE20')]), 2)
+        self.coupon.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+        self.assertEqual(self.other.times_used, 0)
+        self.assertFalse(CouponUsage.objects.filter(user=self.alice).exists())
+        self.assertTrue(CouponUsage.objects.filter(user=self.bob, coupon=self.coupon).exists())
+
+    def test_released_use_can_be_redeemed_again(self):
+        redeem_coupon(self.alice, self.coupon.id)
+        redeem_coupon(self.bob, self.coupon.id)
+        release_coupons([(self.alice.id, 'SAVE10')])
+        redeem_coupon(self.alice, self.coupon.id)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 2)
+
+    def test_release_is_idempotent(self):
+        redeem_coupon(self.alice, self.coupon.id)
+        release_coupons([(self.alice.id, 'SAVE10')])
+        self.assertEqual(release_coupons([(self.alice.id, 'SAVE10'), (self.bob.id, 'NOSUCH')]), 0)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
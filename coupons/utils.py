@@ -0,0 +1,134 @@
+# coupons/utils.py
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Coupon, CouponUsage
+
+ACTIVE_COUPONS_KEY = 'coupons:active'
+ACTIVE_COUPONS_TIMEOUT = 60 * 15
+
+
+class CouponUnavailable(Exception):
+    pass
+
+
+def _active_coupons():
+    """{code: coupon} for every active coupon that hadn't expired when the set was built."""
+    coupons = cache.get(ACTIVE_COUPONS_KEY)
+    if coupons is None:
+        coupons = {
+            coupon.code: coupon
+            for coupon in Coupon.objects.filter(
+                Q(valid_until__isnull=True) | Q(valid_until__gte=timezone.now()), is_active=True,
+            )
+        }
+        cache.set(ACTIVE_COUPONS_KEY, coupons, ACTIVE_COUPONS_TIMEOUT)
+    return coupons
+
+
+def forget_active_coupons():
+    cache.delete(ACTIVE_COUPONS_KEY)
+
+
+def is_valid_at(coupon, now):
+    return coupon.valid_from <= now and (coupon.valid_until is None or coupon.valid_until >= now)
+
+
+def is_exhausted(coupon):
+    return coupon.usage_limit > 0 and coupon.times_used >= coupon.usage_limit
+
+
+def calculate_discount(coupon, subtotal, delivery_charge):
+    """What a coupon takes off an order, or None if the subtotal is under its minimum purchase."""
+    if subtotal < coupon.min_purchase_amount:
+        return None
+    total_before_discount = subtotal + delivery_charge
+    discount_amount = (total_before_discount * Decimal(coupon.discount_percentage)) / Decimal('100')
+    if coupon.max_discount_amount and discount_amount > coupon.max_discount_amount:
+        discount_amount = coupon.max_discount_amount
+    discount_amount = min(discount_amount, total_before_discount)
+    return round(max(discount_amount, Decimal('0')), 2)
+
+
+def get_active_coupon(code):
+    """The active coupon with this code from the cached set, or None. Its validity window is left to the caller."""
+    return _active_coupons().get(code)
+
+
+def available_coupons(user, now=None):
+    """Coupons the user can apply right now, biggest discount first."""
+    now = now or timezone.now()
+    used = set(CouponUsage.objects.filter(user=user).values_list('coupon_id', flat=True))
+    return sorted(
+        (
+            coupon for coupon in _active_coupons().values()
+            if coupon.id not in used and is_valid_at(coupon, now) and not is_exhausted(coupon)
+        ),
+        key=lambda coupon: coupon.discount_percentage,
+        reverse=True,
+    )
+
+
+def redeem_coupon(user, coupon_id, now=None):
+    """
+    Count one use of a coupon for a user. The counter only moves in a
+    conditional UPDATE ... WHERE times_used < usage_limit, so concurrent
+    redemptions can never overshoot the limit. Raises CouponUnavailable,
+    with nothing recorded, if the coupon is used up, expired or inactive,
+    or this user has already used it.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        claimed = Coupon.objects.filter(
+            Q(usage_limit=0) | Q(times_used__lt=F('usage_limit')),
+            Q(valid_until__isnull=True) | Q(valid_until__gte=now),
+            id=coupon_id,
+            is_active=True,
+            valid_from__lte=now,
+        ).update(times_used=F('times_used') + 1)
+        if not claimed:
+            raise CouponUnavailable('This coupon is no longer available.')
+        try:
+            with transaction.atomic():
+                CouponUsage.objects.create(user=user, coupon_id=coupon_id)
+        except IntegrityError:
+            raise CouponUnavailable('You have already used this coupon.') from None
+
+    # update() skips signals; drop the cached set once the last use is taken so it stops being offered
+    if Coupon.objects.filter(id=coupon_id, usage_limit__gt=0, times_used__gte=F('usage_limit')).exists():
+        transaction.on_commit(forget_active_coupons)
+
+
+def release_coupons(redemptions):
+    """
+    Give back coupons redeemed for orders that never went through, given
+    (user_id, coupon_code) pairs. Usage rows go in one DELETE and counters
+    in one UPDATE; returns how many uses were released.
+    """
+    redemptions = set(redemptions)
+    coupon_ids = dict(Coupon.objects.filter(code__in={code for _, code in redemptions}).values_list('code', 'id'))
+    match = Q(pk__in=[])
+    for user_id, code in redemptions:
+        if code in coupon_ids:
+            match |= Q(user_id=user_id, coupon_id=coupon_ids[code])
+
+    with transaction.atomic():
+        usages = list(CouponUsage.objects.select_for_update().filter(match).values_list('id', 'coupon_id'))
+        if not usages:
+            return 0
+        CouponUsage.objects.filter(id__in=[usage_id for usage_id, _ in usages]).delete()
+        released = {}
+        for _, coupon_id in usages:
+            released[coupon_id] = released.get(coupon_id, 0) + 1
+        count = Case(
+            *[When(id=coupon_id, then=Value(n)) for coupon_id, n in released.items()],
+            output_field=PositiveIntegerField(),
+        )
+        Coupon.objects.filter(id__in=released.keys()).update(
+            times_used=Greatest(F('times_used') - count, Value(0), output_field=PositiveIntegerField())
+        )
+    transaction.on_commit(forget_active_coupons)
+    return len(usages)
@@ -292,7 +292,11 @@ def AdminCouponsUpdateView(request, coupon_id):
             coupon.valid_from = valid_from_dt
             coupon.valid_until = valid_until_dt
             coupon.usage_limit = usage_limit
-            coupon.save()
+            # times_used is left out: redeem_coupon moves it concurrently with conditional UPDATEs
+            coupon.save(update_fields=[
+                'code', 'discount_percentage', 'min_purchase_amount', 'max_discount_amount',
+                'valid_from', 'valid_until', 'usage_limit',
+            ])
             
             messages.success(request, "Coupon updated successfully!")
             return redirect("admin_coupons")
@@ -318,7 +322,7 @@ def AdminCouponsToggleStatusView(request, coupon_id):
     if request.method == "POST":
         try:
             coupon.is_active = not coupon.is_active
-            coupon.save()
+            coupon.save(update_fields=['is_active'])
             status = "activated" if coupon.is_active else "deactivated"
             messages.success(request, f"Coupon '{coupon.code}' {status} successfully!")
         except Exception as e:
@@ -1,3 +1,5 @@
 from django.contrib import admin
+from .models import DailySalesRollup, PendingRollupDay
 
-# Register your models here.
+admin.site.register(DailySalesRollup)
+admin.site.register(PendingRollupDay)
@@ -0,0 +1,97 @@
+# dashboard/exports.py
+import csv
+import tempfile
+from itertools import chain
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from orders.models import Order, OrderItem
+
+# Orders read per server-side cursor fetch, and per items query
+EXPORT_CHUNK_SIZE = 2000
+
+HEADER = ['Order ID', 'Date', 'Customer', 'Items', 'Amount', 'Discount', 'Payment', 'Status']
+PAYMENT_LABELS = dict(Order.PAYMENT_CHOICES)
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+def _with_items(batch):
+    summaries = {}
+    for order_id, product_name, quantity in (
+        OrderItem.objects.filter(order_id__in=[row[0] for row in batch], item_status='active')
+        .order_by('order_id', 'id')
+        .values_list('order_id', 'product_name', 'quantity')
+    ):
+        summaries.setdefault(order_id, []).append(f"{product_name} ×{quantity}")
+
+    for (order_id, order_number, created_at, first_name, last_name, username,
+         amount, discount, coupon_discount, payment_method, order_status) in batch:
+        yield (
+            order_number,
+            timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M'),
+            f"{first_name} {last_name}".strip() or username,
+            ', '.join(summaries.get(order_id, [])),
+            amount,
+            (discount or 0) + (coupon_discount or 0),
+            PAYMENT_LABELS.get(payment_method, payment_method),
+            STATUS_LABELS.get(order_status, order_status),
+        )
+
+
+def order_rows(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    One export row per order, newest first. Orders are read as plain tuples
+    through a server-side cursor and their active items fetched once per
+    chunk, so memory stays at one chunk however long the period is.
+    """
+    rows = orders.order_by('-created_at', '-id').values_list(
+        'id', 'order_number', 'created_at', 'user__first_name', 'user__last_name', 'user__username',
+        'total_amount', 'discount_amount', 'coupon_discount', 'payment_method', 'order_status',
+    ).iterator(chunk_size=chunk_size)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield from _with_items(batch)
+            batch = []
+    if batch:
+        yield from _with_items(batch)
+
+
+class _Echo:
+    """A file-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename):
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in chain([HEADER], rows)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(rows, filename):
+    """
+    The rows as an .xlsx attachment. A write-only workbook spools each row to
+    disk as it is appended and the finished file is streamed back from a
+    temporary file, so neither the rows nor the workbook are held in memory.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Orders')
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
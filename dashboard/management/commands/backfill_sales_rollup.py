@@ -0,0 +1,18 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from dashboard.rollup import backfill_sales_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup from the orders table. Run it once after migrating, and schedule it (e.g. nightly via cron) to catch bulk edits that skipped signals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Only rebuild the last N days (default: every day since the first order).")
+
+    def handle(self, *args, **options):
+        start = None
+        if options['days']:
+            start = timezone.localdate() - timedelta(days=options['days'] - 1)
+        rows = backfill_sales_rollup(start=start)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} sales rollup row(s)."))
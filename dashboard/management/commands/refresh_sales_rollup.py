@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from dashboard.rollup import refresh_pending_days
+
+
+class Command(BaseCommand):
+    help = "Rebuild the sales rollup for days whose orders changed since the last run. Schedule it (e.g. every minute via cron)."
+
+    def handle(self, *args, **options):
+        days = refresh_pending_days()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed the sales rollup for {days} day(s)."))
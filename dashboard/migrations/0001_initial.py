@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0005_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('grain', models.CharField(choices=[('order', 'Order'), ('item', 'Item')], max_length=10)),
+                ('payment_method', models.CharField(max_length=20)),
+                ('order_status', models.CharField(max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('coupon_discount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('brand', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.brand')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grain', 'date'], name='sales_rollup_grain_date')],
+            },
+        ),
+    ]
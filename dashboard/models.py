@@ -1,3 +1,47 @@
 from django.db import models
+from products.models import Brand, Category
 
-# Create your models here.
+
+class DailySalesRollup(models.Model):
+    """
+    Sales per local order date, payment method and order status, rebuilt a
+    day at a time by dashboard.rollup. 'order' rows hold order-level figures
+    and leave brand and category empty; 'item' rows split the active items
+    of the same orders by brand and category (units and gross only).
+    """
+    GRAIN_CHOICES = [
+        ('order', 'Order'),
+        ('item', 'Item'),
+    ]
+
+    date = models.DateField()
+    grain = models.CharField(max_length=10, choices=GRAIN_CHOICES)
+    payment_method = models.CharField(max_length=20)
+    order_status = models.CharField(max_length=20)
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    coupon_discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['grain', 'date'], name='sales_rollup_grain_date')]
+
+    def __str__(self):
+        return f"{self.date} {self.grain} {self.payment_method}/{self.order_status}"
+
+
+class PendingRollupDay(models.Model):
+    """
+    A date whose DailySalesRollup rows are out of date. Rows are only ever
+    inserted (so marking a day never waits on another transaction) and are
+    cleared by refresh_pending_days once the day has been rebuilt.
+    """
+    date = models.DateField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.date}"
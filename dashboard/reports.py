@@ -0,0 +1,201 @@
+# dashboard/reports.py
+import calendar
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour, ExtractMonth, TruncDate
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Bucket key per order: hour of day (0-23), local date, or month of year (1-12)
+BUCKETS = {
+    'hour': ExtractHour,
+    'day': TruncDate,
+    'month': ExtractMonth,
+}
+
+
+def _by_bucket(rows):
+    return {
+        row['bucket']: {
+            'count': row['count'],
+            'total': row['total'] or Decimal('0'),
+            'discount': (row['discount'] or Decimal('0')) + (row['coupon'] or Decimal('0')),
+        }
+        for row in rows
+    }
+
+
+def bucket_totals(orders, bucket):
+    """
+    {key: {'count', 'total', 'discount'}} for every bucket that has orders,
+    in one GROUP BY query. discount is the offer and coupon discount together.
+    """
+    return _by_bucket(
+        orders.annotate(bucket=BUCKETS[bucket]('created_at'))
+        .values('bucket')
+        .annotate(
+            count=Count('id'), total=Sum('total_amount'),
+            discount=Sum('discount_amount'), coupon=Sum('coupon_discount'),
+        )
+        .order_by('bucket')
+    )
+
+
+# The same keys read off DailySalesRollup.date; hours are finer than the rollup and have no entry
+ROLLUP_BUCKETS = {
+    'day': F,
+    'month': ExtractMonth,
+}
+
+
+def rollup_bucket_totals(rollup, bucket):
+    """bucket_totals for day and month buckets, summed from the order rows of the daily sales rollup."""
+    return _by_bucket(
+        rollup.filter(grain='order')
+        .annotate(bucket=ROLLUP_BUCKETS[bucket]('date'))
+        .values('bucket')
+        .annotate(
+            count=Sum('orders'), total=Sum('gross'),
+            discount=Sum('discount_amount'), coupon=Sum('coupon_discount'),
+        )
+        .order_by('bucket')
+    )
+
+
+EMPTY_BUCKET = {'count': 0, 'total': Decimal('0'), 'discount': Decimal('0')}
+
+
+class SalesPeriod:
+    """
+    The orders of one sales report period, their rows in the daily sales
+    rollup, and how they split into buckets. Day and month buckets and the
+    period totals are summed from the rollup; only hour buckets go back to
+    the orders themselves. Empty buckets are filled in here.
+    """
+
+    def __init__(self, orders, rollup, label, bucket, keys, chart_labels, row_label,
+                 row_bucket=None, keep_empty_rows=False):
+        self.orders = orders
+        self.rollup = rollup
+        self.label = label
+        self.bucket = bucket
+        self.keys = keys
+        self.chart_labels = chart_labels
+        self.row_label = row_label
+        self.row_bucket = row_bucket or bucket
+        self.keep_empty_rows = keep_empty_rows
+        self._buckets = {}
+
+    def buckets(self, bucket=None):
+        bucket = bucket or self.bucket
+        if bucket not in self._buckets:
+            if bucket in ROLLUP_BUCKETS:
+                self._buckets[bucket] = rollup_bucket_totals(self.rollup, bucket)
+            else:
+                self._buckets[bucket] = bucket_totals(self.orders, bucket)
+        return self._buckets[bucket]
+
+    def chart_data(self):
+        buckets = self.buckets()
+        return json.dumps({
+            'labels': self.chart_labels,
+            'amounts': [float(buckets.get(key, EMPTY_BUCKET)['total']) for key in self.keys],
+        })
+
+    def totals(self):
+        """Order count, amount and discount over the whole period, in one query on the rollup."""
+        totals = self.rollup.filter(grain='order').aggregate(
+            count=Sum('orders'), total=Sum('gross'),
+            discount=Sum('discount_amount'), coupon=Sum('coupon_discount'),
+        )
+        return {
+            'count': totals['count'] or 0,
+            'total': totals['total'] or Decimal('0'),
+            'discount': (totals['discount'] or Decimal('0')) + (totals['coupon'] or Decimal('0')),
+        }
+
+    def rows(self):
+        """Per-bucket rows for the PDF, skipping empty buckets unless the period keeps them."""
+        buckets = self.buckets(self.row_bucket)
+        keys = self.keys if self.row_bucket == self.bucket else sorted(buckets)
+        rows = []
+        for key in keys:
+            bucket = buckets.get(key, EMPTY_BUCKET)
+            if bucket['count'] or self.keep_empty_rows:
+                rows.append({'date': self.row_label(key), **bucket})
+        return rows
+
+
+def sales_period(orders, rollup, report_type, start_date_str, end_date_str, today):
+    """
+    The SalesPeriod for a sales report request. orders and rollup hold the
+    same sales, as Order rows and as DailySalesRollup rows.
+    """
+    def dated(**lookups):
+        # The same date lookups on the rollup's date and the orders' local creation date
+        return (
+            orders.filter(**{f'created_at__{lookup}': value for lookup, value in lookups.items()}),
+            rollup.filter(**lookups),
+        )
+
+    if report_type == 'daily':
+        return SalesPeriod(
+            *dated(date=today),
+            f"Daily Report – {today.strftime('%B %d, %Y')}",
+            'hour', list(range(24)), [f"{h:02d}:00" for h in range(24)],
+            lambda h: f"{today.strftime('%Y-%m-%d')} {h:02d}:00",
+        )
+
+    if report_type == 'weekly':
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+        return SalesPeriod(
+            *dated(date__range=[week_start, week_end]),
+            f"Weekly Report – {week_start.strftime('%b %d')} to {week_end.strftime('%b %d, %Y')}",
+            'day', [week_start + timedelta(days=i) for i in range(7)],
+            ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+            lambda day: day.strftime('%Y-%m-%d'),
+            keep_empty_rows=True,
+        )
+
+    if report_type == 'monthly':
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        return SalesPeriod(
+            *dated(date__year=today.year, date__month=today.month),
+            f"Monthly Report – {today.strftime('%B %Y')}",
+            'day', [today.replace(day=d) for d in range(1, days_in_month + 1)],
+            [str(d) for d in range(1, days_in_month + 1)],
+            lambda day: day.strftime('%Y-%m-%d'),
+        )
+
+    if report_type == 'yearly':
+        return SalesPeriod(
+            *dated(date__year=today.year),
+            f"Yearly Report – {today.year}",
+            'month', list(range(1, 13)), MONTHS,
+            lambda m: f"{today.year} {MONTHS[m - 1]}",
+        )
+
+    if report_type == 'custom' and start_date_str and end_date_str:
+        try:
+            start = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return SalesPeriod(orders, rollup, "Custom Report", 'day', [], [], lambda day: day.strftime('%Y-%m-%d'))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        return SalesPeriod(
+            *dated(date__range=[start, end]),
+            f"Custom – {start.strftime('%b %d, %Y')} to {end.strftime('%b %d, %Y')}",
+            'day', days, [day.strftime('%d %b') for day in days],
+            lambda day: day.strftime('%Y-%m-%d'),
+        )
+
+    # All time: the chart adds up each calendar month across years, the PDF lists every day with sales
+    return SalesPeriod(
+        orders, rollup, "All Time Report",
+        'month', list(range(1, 13)), MONTHS,
+        lambda day: day.strftime('%Y-%m-%d'),
+        row_bucket='day',
+    )
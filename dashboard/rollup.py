@@ -0,0 +1,136 @@
+# dashboard/rollup.py
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from wallet.models import WalletTransaction
+from .models import DailySalesRollup, PendingRollupDay
+
+# First key of the advisory lock taken per rolled-up day
+ROLLUP_LOCK = 4127
+
+
+def order_day(order):
+    """The rollup date of an order: the local date it was created on."""
+    return timezone.localtime(order.created_at).date()
+
+
+def _order_rows(orders):
+    refunds = {
+        (row['day'], row['method'], row['status']): row['refunds']
+        for row in WalletTransaction.objects.filter(order__in=orders, transaction_type='credit')
+        .values(day=TruncDate('order__created_at'), method=F('order__payment_method'), status=F('order__order_status'))
+        .annotate(refunds=Sum('amount'))
+    }
+    return [
+        DailySalesRollup(
+            date=row['day'],
+            grain='order',
+            payment_method=row['payment_method'],
+            order_status=row['order_status'],
+            orders=row['count'],
+            gross=row['gross'] or Decimal('0'),
+            discount_amount=row['discount'] or Decimal('0'),
+            coupon_discount=row['coupon'] or Decimal('0'),
+            refunds=refunds.get((row['day'], row['payment_method'], row['order_status'])) or Decimal('0'),
+        )
+        for row in orders.annotate(day=TruncDate('created_at'))
+        .values('day', 'payment_method', 'order_status')
+        .annotate(
+            count=Count('id'), gross=Sum('total_amount'),
+            discount=Sum('discount_amount'), coupon=Sum('coupon_discount'),
+        )
+        .order_by()
+    ]
+
+
+def _item_rows(orders):
+    return [
+        DailySalesRollup(
+            date=row['day'],
+            grain='item',
+            payment_method=row['method'],
+            order_status=row['status'],
+            brand_id=row['brand'],
+            category_id=row['category'],
+            units=row['units'] or 0,
+            gross=row['gross'] or Decimal('0'),
+        )
+        for row in OrderItem.objects.filter(order__in=orders, item_status='active')
+        .values(
+            day=TruncDate('order__created_at'),
+            method=F('order__payment_method'),
+            status=F('order__order_status'),
+            brand=F('variant__product__brand'),
+            category=F('variant__product__category'),
+        )
+        .annotate(units=Sum('quantity'), gross=Sum('subtotal'))
+        .order_by()
+    ]
+
+
+def refresh_sales_rollup(days):
+    """
+    Rebuild the rollup rows of these dates from the orders created on them,
+    in a fixed number of queries. Each day is locked while it is rebuilt,
+    so concurrent refreshes of the same day run one after the other.
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+    orders = Order.objects.filter(created_at__date__in=days)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for day in days:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [ROLLUP_LOCK, day.toordinal()])
+        DailySalesRollup.objects.filter(date__in=days).delete()
+        rows = DailySalesRollup.objects.bulk_create(_order_rows(orders) + _item_rows(orders))
+    return len(rows)
+
+
+def mark_days(days):
+    """
+    Queue these dates for refresh_pending_days. The marks are written in the
+    caller's transaction, so they vanish with it on rollback, and the
+    rebuild itself stays off the request path.
+    """
+    PendingRollupDay.objects.bulk_create([PendingRollupDay(date=day) for day in set(days)])
+
+
+def refresh_pending_days(batch_days=31):
+    """
+    Rebuild every marked date once, however many times it was marked, and
+    clear only the marks that were read before the rebuild. A mark committed
+    while a day is being rebuilt, whatever its id, stays for the next run.
+    Returns the days rebuilt.
+    """
+    refreshed = 0
+    while True:
+        days = list(
+            PendingRollupDay.objects.values_list('date', flat=True).distinct().order_by('date')[:batch_days]
+        )
+        if not days:
+            return refreshed
+        mark_ids = list(PendingRollupDay.objects.filter(date__in=days).values_list('id', flat=True))
+        refresh_sales_rollup(days)
+        PendingRollupDay.objects.filter(id__in=mark_ids).delete()
+        refreshed += len(days)
+
+
+def backfill_sales_rollup(start=None, end=None, chunk_days=31):
+    """Rebuild the rollup for every date from start to end (default: the first order to today); returns rows written."""
+    if start is None:
+        first = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            return 0
+        start = timezone.localtime(first).date()
+    end = end or timezone.localdate()
+    written = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        written += refresh_sales_rollup(start + timedelta(days=i) for i in range((chunk_end - start).days + 1))
+        start = chunk_end + timedelta(days=1)
+    return written
@@ -0,0 +1,21 @@
+# dashboard/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from orders.models import Order, OrderItem
+from wallet.models import WalletTransaction
+from .rollup import order_day, mark_days
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    mark_days([order_day(instance)])
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=WalletTransaction)
+@receiver(post_delete, sender=WalletTransaction)
+def order_line_changed(sender, instance, **kwargs):
+    if instance.order_id:
+        mark_days([order_day(instance.order)])
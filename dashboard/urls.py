@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.DashboardHomeView, name='admin_index'),
     path('sales-report/', views.sales_report_view, name='sales_report'),
     path('sales-report/pdf/', views.download_sales_pdf, name='download_sales_pdf'),
+    path('sales-report/export/<str:file_format>/', views.export_sales_report, name='export_sales_report'),
 ]
 
 
@@ -0,0 +1,214 @@
+# documents/jobs.py
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import PdfJob
+from .render import stylesheet_path, warm_up, write_pdf
+
+# A job that fails this many times is left as failed
+MAX_JOB_ATTEMPTS = 3
+# A running job not finished by then lost its worker and is queued again
+STALE_AFTER = timedelta(minutes=10)
+# How often a long-running worker prunes old jobs and files
+PRUNE_EVERY = timedelta(hours=1)
+
+logger = logging.getLogger(__name__)
+
+
+def version_digest(*parts):
+    """A cache name for a PDF known by what it shows (e.g. an order number and its updated_at) rather than its HTML."""
+    return hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def content_hash(html, base_url='', stylesheet=''):
+    css = stylesheet_path(stylesheet).read_bytes() if stylesheet else b''
+    return version_digest(base_url, hashlib.sha256(css).hexdigest(), html)
+
+
+def cache_path(digest):
+    """Where the PDF cached under this digest is kept."""
+    return Path(settings.PDF_CACHE_DIR) / f"{digest}.pdf"
+
+
+def find_pdf(user, digest, filename):
+    """
+    The user's job for the PDF cached under digest, without rendering
+    anything: a done job if the file is on disk, the job still queued for
+    it, or None.
+    """
+    cached = cache_path(digest).exists()
+    job = (
+        PdfJob.objects.filter(user=user, content_hash=digest, status__in=['pending', 'running', 'done'])
+        .order_by('-id')
+        .first()
+    )
+    if cached:
+        # Pruning goes by modification time, so files still being asked for are kept
+        os.utime(cache_path(digest))
+    if job and (job.status != 'done' or cached):
+        return job
+    if cached:
+        return PdfJob.objects.create(
+            user=user, filename=filename, content_hash=digest, status='done', finished_at=timezone.now(),
+        )
+    return None
+
+
+def enqueue_pdf(user, html, filename, base_url='', stylesheet='', digest=None):
+    """
+    Queue html to be rendered into a PDF for user, with a stylesheet from
+    documents/stylesheets. The PDF is cached under digest, by default a
+    hash of everything that goes into it, so HTML rendered before comes
+    back as a done job and HTML still queued returns the queued job.
+    """
+    digest = digest or content_hash(html, base_url, stylesheet)
+    return find_pdf(user, digest, filename) or PdfJob.objects.create(
+        user=user, filename=filename, html=html, base_url=base_url, stylesheet=stylesheet, content_hash=digest,
+    )
+
+
+def claim_jobs(limit):
+    """Mark up to limit pending jobs running and return them, oldest first, skipping rows another worker holds."""
+    now = timezone.now()
+    stale = PdfJob.objects.filter(status='running', started_at__lt=now - STALE_AFTER)
+    # A job that keeps taking its worker down with it must not be retried forever
+    stale.filter(attempts__gte=MAX_JOB_ATTEMPTS).update(
+        status='failed', error='PDF worker stopped while rendering', finished_at=now,
+    )
+    stale.update(status='pending')
+    with transaction.atomic():
+        jobs = list(
+            PdfJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')[:limit]
+        )
+        PdfJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='running', started_at=now, attempts=F('attempts') + 1,
+        )
+    return jobs
+
+
+def _retry_or_fail(job, error):
+    PdfJob.objects.filter(id=job.id).update(
+        status='failed' if job.attempts + 1 >= MAX_JOB_ATTEMPTS else 'pending',
+        error=error,
+        finished_at=timezone.now(),
+    )
+
+
+def run_jobs(pool, jobs):
+    """
+    Render claimed jobs in the process pool and record how each went;
+    returns how many finished. Raises BrokenProcessPool, after putting the
+    unfinished jobs back in the queue, if a pool process died.
+    """
+    Path(settings.PDF_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    futures = []
+    try:
+        for job in jobs:
+            path = cache_path(job.content_hash)
+            # Another job may have rendered the same PDF since this one was queued
+            future = None
+            if not path.exists():
+                future = pool.submit(write_pdf, job.html, job.base_url, str(path), job.stylesheet)
+            futures.append((job, future))
+    except BrokenProcessPool:
+        for job in jobs:
+            _retry_or_fail(job, 'PDF worker process died')
+        raise
+
+    finished = 0
+    broken = None
+    for job, future in futures:
+        try:
+            if future is not None:
+                future.result()
+        except BrokenProcessPool as e:
+            # A pool process died (e.g. out of memory) and took every unfinished job with it
+            broken = e
+            _retry_or_fail(job, 'PDF worker process died')
+        except Exception as e:
+            logger.exception(f"Rendering PDF job {job.id} failed")
+            _retry_or_fail(job, str(e))
+        else:
+            PdfJob.objects.filter(id=job.id).update(status='done', html='', error='', finished_at=timezone.now())
+            finished += 1
+    if broken:
+        raise broken
+    return finished
+
+
+def prune_pdfs(older_than):
+    """
+    Delete finished and failed jobs created before older_than, and cached
+    files (or leftovers of renders that died) not used since then. Returns
+    counts of jobs and files removed.
+    """
+    jobs, _ = PdfJob.objects.filter(status__in=['done', 'failed'], created_at__lt=older_than).delete()
+    files = 0
+    cutoff = older_than.timestamp()
+    for path in Path(settings.PDF_CACHE_DIR).glob('*'):
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                files += 1
+        except FileNotFoundError:
+            pass
+    return {'jobs': jobs, 'files': files}
+
+
+def _new_pool(processes):
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=warm_up,
+    )
+
+
+def run_worker(processes=None, poll_interval=2, once=False, keep_for=None):
+    """
+    Render queued PDFs with a pool of processes until stopped, or with once
+    until the queue is empty. With keep_for (a timedelta), jobs and files
+    older than that are pruned at start and every PRUNE_EVERY. If a pool
+    process dies the pool is rebuilt, and jobs are then claimed one at a
+    time until one batch goes through, so a PDF that kills its process
+    only uses up its own attempts. Returns how many jobs finished.
+    """
+    processes = processes or os.cpu_count() or 1
+    # Pool processes are spawned fresh and only run write_pdf, so they never share the parent's connections
+    connections.close_all()
+    finished = 0
+    isolate = False
+    pruned_at = None
+    pool = _new_pool(processes)
+    try:
+        while True:
+            if keep_for and (pruned_at is None or timezone.now() - pruned_at >= PRUNE_EVERY):
+                pruned_at = timezone.now()
+                pruned = prune_pdfs(pruned_at - keep_for)
+                logger.info(f"Pruned {pruned['jobs']} PDF job(s) and {pruned['files']} file(s)")
+
+            jobs = claim_jobs(1 if isolate else processes * 2)
+            if jobs:
+                try:
+                    finished += run_jobs(pool, jobs)
+                    isolate = False
+                except BrokenProcessPool:
+                    logger.error("A PDF worker process died; restarting the pool")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _new_pool(processes)
+                    isolate = True
+            elif once:
+                return finished
+            else:
+                time.sleep(poll_interval)
+    finally:
+        pool.shutdown()
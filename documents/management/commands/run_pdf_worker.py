@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from documents.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF jobs (invoices, sales reports) with a pool of processes. Keep it running (e.g. under systemd or supervisor), or schedule it with --once (e.g. every minute via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help="Rendering processes (default: one per CPU).")
+        parser.add_argument('--poll-interval', type=float, default=2, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--prune-days', type=int, default=30, help="Delete jobs and cached PDFs unused for this many days (0 keeps them).")
+
+    def handle(self, *args, **options):
+        finished = run_worker(
+            processes=options['processes'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            keep_for=timedelta(days=options['prune_days']) if options['prune_days'] else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rendered {finished} PDF job(s)."))
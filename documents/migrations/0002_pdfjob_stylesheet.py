@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfjob',
+            name='stylesheet',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
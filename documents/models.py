@@ -0,0 +1,37 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class PdfJob(models.Model):
+    """
+    A PDF waiting for, or rendered by, the run_pdf_worker command. The HTML
+    is rendered by the view that queues the job; the worker only turns it
+    into a PDF, stored on disk under content_hash (see documents.jobs).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pdf_jobs')
+    filename = models.CharField(max_length=255)
+    html = models.TextField(blank=True)
+    base_url = models.CharField(max_length=500, blank=True)
+    stylesheet = models.CharField(max_length=50, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='pdfjob_status_created')]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
@@ -0,0 +1,46 @@
+# documents/render.py
+import os
+from functools import lru_cache
+from pathlib import Path
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+STYLESHEETS_DIR = Path(__file__).resolve().parent / 'stylesheets'
+
+
+def stylesheet_path(name):
+    return STYLESHEETS_DIR / f"{name}.css"
+
+
+@lru_cache(maxsize=1)
+def _font_config():
+    # Font lookup is the slow part of a first render; each worker process sets it up once
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _stylesheet(name):
+    return CSS(filename=str(stylesheet_path(name)), font_config=_font_config())
+
+
+def warm_up():
+    """Set up fonts and parse every stylesheet before the first job; the worker's pool runs this in each process."""
+    _font_config()
+    for path in STYLESHEETS_DIR.glob('*.css'):
+        _stylesheet(path.stem)
+
+
+def write_pdf(html, base_url, path, stylesheet=''):
+    """
+    Render html into a PDF file at path, with the named stylesheet from
+    STYLESHEETS_DIR parsed once per process. This runs in the PDF worker's
+    process pool, so it must not touch Django; the file is written under a
+    temporary name and moved into place, so readers never see half a PDF.
+    """
+    partial_path = f"{path}.{os.getpid()}.part"
+    HTML(string=html, base_url=base_url or None).write_pdf(
+        partial_path,
+        stylesheets=[_stylesheet(stylesheet)] if stylesheet else None,
+        font_config=_font_config(),
+    )
+    os.replace(partial_path, path)
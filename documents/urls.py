@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+
+
+urlpatterns = [
+    path('pdf/<int:job_id>/status/', views.pdf_job_status, name='pdf_job_status'),
+    path('pdf/<int:job_id>/download/', views.pdf_job_download, name='pdf_job_download'),
+]
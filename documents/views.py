@@ -0,0 +1,39 @@
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from .jobs import cache_path
+from .models import PdfJob
+
+
+def _get_job(request, job_id):
+    owner = {} if request.user.is_superuser else {'user': request.user}
+    return get_object_or_404(PdfJob, id=job_id, **owner)
+
+
+def _file_response(job):
+    path = cache_path(job.content_hash)
+    if job.status != 'done' or not path.exists():
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.filename, content_type='application/pdf')
+
+
+def pdf_job_response(request, job):
+    """Send a finished job's file right away; otherwise show a page that waits for the worker, then downloads."""
+    if job.status == 'done':
+        return _file_response(job)
+    return render(request, 'documents/pdf_job.html', {'job': job})
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    job = _get_job(request, job_id)
+    return JsonResponse({
+        'status': job.status,
+        'download_url': reverse('pdf_job_download', args=[job.id]) if job.status == 'done' else '',
+    })
+
+
+@login_required
+def pdf_job_download(request, job_id):
+    return _file_response(_get_job(request, job_id))
@@ -0,0 +1,76 @@
+# home/featured.py
+from django.db.models import Prefetch
+from offers.utils import get_offer_prices
+from products.cache import catalog_timeout, get_or_build
+from products.models import Product, ProductImage, ProductVariant
+from products.utils import first_image
+from Server.pagination import CURSOR_PARAM, CursorPaginator
+
+FEATURED_PER_PAGE = 8
+
+
+def _in_stock_variants_prefetch():
+    return Prefetch(
+        'variants',
+        queryset=ProductVariant.objects.filter(is_listed=True, stock__gt=0).order_by('id').prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.order_by('id'))
+        ),
+        to_attr='in_stock_variants',
+    )
+
+
+def _featured_page(request):
+    products = Product.objects.filter(
+        is_listed=True,
+        category__is_listed=True,
+        brand__is_listed=True,
+        variants__is_listed=True,
+        variants__stock__gt=0,
+    ).distinct().prefetch_related(_in_stock_variants_prefetch())
+    # Prefetches run on the sliced page only, so variants and images cost two queries per page
+    page = CursorPaginator(products, FEATURED_PER_PAGE, ('id',)).get_page(request)
+
+    items = []
+    for product in page:
+        if not product.in_stock_variants:
+            continue
+        default_variant = product.in_stock_variants[0]
+        items.append({
+            'id': default_variant.id,
+            'product': product,
+            'variant': default_variant,
+            'image': first_image(default_variant),
+            'original_price': default_variant.price,
+            'in_stock': True,
+            'available_variants': [
+                {'id': v.id, 'color_name': v.color_name, 'color_code': v.color_code}
+                for v in product.in_stock_variants
+            ],
+        })
+
+    prices = get_offer_prices([item['variant'] for item in items])
+    for item in items:
+        final_price, discount_percentage, _ = prices[item['variant'].id]
+        item['price'] = round(final_price, 2)
+        item['final_price'] = round(final_price, 2)
+        item['discount_percentage'] = round(discount_percentage, 1)
+
+    page.object_list = items
+    return page
+
+
+def get_featured_page(request):
+    """
+    One page of the home feed's featured products. Only the visible products
+    are hydrated, and the assembled page is cached per cursor until the
+    catalog version moves (catalog and offer changes) or the earliest offer
+    on the page runs out.
+    """
+    page = get_or_build(
+        'home_featured',
+        (request.GET.get(CURSOR_PARAM, ''),),
+        lambda: _featured_page(request),
+        timeout=lambda page: catalog_timeout(item['variant'] for item in page),
+    )
+    page.request = request
+    return page
@@ -0,0 +1,11 @@
+# home/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.cache import bump_catalog_version
+from .models import Banner
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def banner_changed(sender, **kwargs):
+    bump_catalog_version()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.models import ProductVariant
+from offers.utils import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    help = "Recompute ProductVariant.effective_price for offers that expired. Schedule it (e.g. every 5 minutes via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every variant (backfill).")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['all']:
+            variants = ProductVariant.objects.all()
+        else:
+            variants = ProductVariant.objects.filter(offer_valid_until__lt=now)
+
+        updated = 0
+        ids = list(variants.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), 1000):
+            chunk = ProductVariant.objects.filter(id__in=ids[start:start + 1000])
+            updated += refresh_effective_prices(chunk, now=now)
+        self.stdout.write(self.style.SUCCESS(f"Updated effective price for {updated} variant(s)."))
@@ -0,0 +1,32 @@
+# offers/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from products.models import Product, ProductVariant
+from .models import BrandOffer, ProductOffer
+from .utils import refresh_effective_prices, set_effective_price
+
+
+@receiver(pre_save, sender=ProductVariant)
+def variant_price_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    if instance.pk and instance.effective_price is not None and instance.price == getattr(instance, '_loaded_price', None):
+        return
+    set_effective_price(instance)
+
+
+@receiver([post_save, post_delete], sender=ProductOffer)
+def product_offer_changed(sender, instance, **kwargs):
+    refresh_effective_prices(ProductVariant.objects.filter(product_id=instance.product_id))
+
+
+@receiver([post_save, post_delete], sender=BrandOffer)
+def brand_offer_changed(sender, instance, **kwargs):
+    refresh_effective_prices(ProductVariant.objects.filter(product__brand_id=instance.brand_id))
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    # The brand may have changed, which swaps the brand offer in play
+    if not created:
+        refresh_effective_prices(ProductVariant.objects.filter(product=instance))
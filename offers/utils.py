@@ -1,6 +1,10 @@
 # offers/utils.py
 from django.utils import timezone
+from django.db.models import Q
 from decimal import Decimal
+from products.cache import bump_catalog_version
+from products.models import ProductVariant
+from .models import BrandOffer, ProductOffer
 
 def get_best_offer_price(product, base_price):
     best_discount = Decimal("0")
@@ -49,4 +53,108 @@ def get_offer_details(product, base_price):
                     if brand_offer.discount_percentage == discount_percentage:
                         offer_type = 'brand'
     
-    return final_price, discount_percentage, offer_type
\ No newline at end of file
+    return final_price, discount_percentage, offer_type
+
+
+def _resolve_offers(products, now):
+    """
+    Returns {product_id: (discount_percentage, offer_type, valid_until)} for
+    the best running offer of each product. A product offer wins ties with
+    a brand offer, same as get_offer_details.
+    """
+    brand_ids = {product.id: product.brand_id for product in products}
+    if not brand_ids:
+        return {}
+
+    running = Q(is_active=True) & (Q(valid_until__isnull=True) | Q(valid_until__gte=now))
+    product_offers = {
+        product_id: (discount, valid_until)
+        for product_id, discount, valid_until in ProductOffer.objects.filter(
+            running, product_id__in=brand_ids.keys()
+        ).values_list('product_id', 'discount_percentage', 'valid_until')
+    }
+    brand_offers = {
+        brand_id: (discount, valid_until)
+        for brand_id, discount, valid_until in BrandOffer.objects.filter(
+            running, brand_id__in=set(brand_ids.values())
+        ).values_list('brand_id', 'discount_percentage', 'valid_until')
+    }
+
+    offers = {}
+    for product_id, brand_id in brand_ids.items():
+        discount, offer_type, valid_until = Decimal("0"), None, None
+        if product_id in product_offers:
+            discount, valid_until = product_offers[product_id]
+            offer_type = 'product'
+        if brand_id in brand_offers and brand_offers[brand_id][0] > discount:
+            discount, valid_until = brand_offers[brand_id]
+            offer_type = 'brand'
+        offers[product_id] = (discount, offer_type, valid_until)
+    return offers
+
+
+def get_active_offers(products, now=None):
+    """
+    Resolve the best running offer for many products at once.
+    Product and brand offers are fetched in one query each, evaluated at a
+    single timestamp, and returned as {product_id: (discount_percentage, offer_type)}.
+    """
+    offers = _resolve_offers(products, now or timezone.now())
+    return {product_id: (discount, offer_type) for product_id, (discount, offer_type, _) in offers.items()}
+
+
+def apply_discount(base_price, discount_percentage):
+    return base_price - (base_price * discount_percentage) / Decimal("100")
+
+
+def get_offer_prices(variants, now=None):
+    """
+    Batch version of get_offer_details for a list of variants.
+    Returns {variant_id: (final_price, discount_percentage, offer_type)}.
+    Variants should come with their product loaded (select_related('product')).
+    """
+    variants = [variant for variant in variants if variant is not None]
+    products = {}
+    for variant in variants:
+        if variant.product_id not in products:
+            products[variant.product_id] = variant.product
+    offers = get_active_offers(products.values(), now)
+
+    prices = {}
+    for variant in variants:
+        discount, offer_type = offers.get(variant.product_id, (Decimal("0"), None))
+        prices[variant.id] = (apply_discount(variant.price, discount), discount, offer_type)
+    return prices
+
+
+
+def refresh_effective_prices(variants, now=None):
+    """
+    Recompute effective_price and offer_valid_until for a ProductVariant
+    queryset and write back only the rows that changed.
+    """
+    now = now or timezone.now()
+    variants = list(variants.select_related('product'))
+    offers = _resolve_offers({variant.product_id: variant.product for variant in variants}.values(), now)
+
+    changed = []
+    for variant in variants:
+        discount, _, valid_until = offers.get(variant.product_id, (Decimal("0"), None, None))
+        effective_price = apply_discount(variant.price, discount).quantize(Decimal("0.01"))
+        if variant.effective_price != effective_price or variant.offer_valid_until != valid_until:
+            variant.effective_price = effective_price
+            variant.offer_valid_until = valid_until
+            changed.append(variant)
+
+    ProductVariant.objects.bulk_update(changed, ['effective_price', 'offer_valid_until'], batch_size=500)
+    if changed:
+        bump_catalog_version()
+    return len(changed)
+
+
+def set_effective_price(variant, now=None):
+    """Fill effective_price on an unsaved variant; used when its base price changes."""
+    offers = _resolve_offers([variant.product], now or timezone.now())
+    discount, _, valid_until = offers[variant.product_id]
+    variant.effective_price = apply_discount(Decimal(str(variant.price)), discount).quantize(Decimal("0.01"))
+    variant.offer_valid_until = valid_until
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import OrderItem, Order, OrderAddress
+from .models import OrderItem, Order, OrderAddress, StockReservation
 
 admin.site.register(Order)
 admin.site.register(OrderItem)
-admin.site.register(OrderAddress)
\ No newline at end of file
+admin.site.register(OrderAddress)
+admin.site.register(StockReservation)
+
@@ -0,0 +1,58 @@
+# orders/assembly.py
+from .models import Order, OrderAddress, OrderItem
+
+# Status fields a new order starts with, per payment method
+INITIAL_STATUS = {
+    'wallet': {'order_status': 'confirmed', 'payment_status': 'paid', 'is_paid': True},
+    'online': {'order_status': 'pending', 'payment_status': 'pending', 'is_paid': False},
+    'cod': {'order_status': 'confirmed', 'payment_status': 'pending', 'is_paid': False},
+}
+
+
+def assemble_order(user, totals, address, payment_method, delivery_charge, coupon_code=None, coupon_discount=0):
+    """
+    Write an order for a priced cart (checkout.snapshot.CheckoutSnapshot) in
+    three inserts: the order with its coupon fields, its address snapshot,
+    and all of its items in one bulk_create. Stock is left to the caller.
+    """
+    order = Order.objects.create(
+        user=user,
+        address=address,
+        subtotal=totals.subtotal,
+        delivery_charge=delivery_charge,
+        discount_amount=coupon_discount,
+        coupon_code=coupon_code,
+        coupon_discount=coupon_discount if coupon_code else 0,
+        total_amount=totals.subtotal + delivery_charge - coupon_discount,
+        payment_method=payment_method,
+        **INITIAL_STATUS[payment_method],
+    )
+
+    OrderAddress.objects.create(
+        order=order,
+        full_name=address.full_name,
+        phone_number=address.mobile_number,
+        flat_house=address.flat_house,
+        area_street=address.area_street,
+        landmark=address.landmark or '',
+        town_city=address.town_city,
+        state=address.state,
+        pincode=address.pincode
+    )
+
+    # bulk_create skips OrderItem.save, so the fields it derives are filled in here
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            variant_id=item.variant_id,
+            product_name=item.product_name,
+            color_name=item.color_name,
+            color_code=item.color_code,
+            price=item.final_price,
+            quantity=item.quantity,
+            subtotal=item.item_subtotal,
+            item_status='active',
+        )
+        for item in totals.items
+    ])
+    return order
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from orders.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Put back stock held by unpaid online orders whose reservation expired. Schedule it (e.g. every minute via cron)."
+
+    def handle(self, *args, **options):
+        order_ids = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released stock for {len(order_ids)} order(s)."))
@@ -120,6 +120,21 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockReservation(models.Model):
+    """Stock held for an unpaid online order until it is paid or expires_at passes."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['order', 'variant']
+
+    def __str__(self):
+        return f"{self.order.order_number} - {self.variant_id} x {self.quantity}"
+
+
 class OrderAddress(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='delivery_address')
     full_name = models.CharField(max_length=100)
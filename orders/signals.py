@@ -0,0 +1,12 @@
+# orders/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Order, OrderItem
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, **kwargs):
+    # updated_at versions the order (cached invoices are keyed on it), so an item change moves it on too
+    if not created:
+        Order.objects.filter(id=instance.order_id).update(updated_at=timezone.now())
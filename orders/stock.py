@@ -0,0 +1,135 @@
+# orders/stock.py
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from products.cache import bump_catalog_version
+from products.models import ProductVariant
+from .models import StockReservation
+
+# How long an unpaid online order keeps its stock before the release job puts it back
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+class OutOfStock(Exception):
+    def __init__(self, variants):
+        self.variants = variants
+        names = ', '.join(variant.product.name for variant in variants)
+        super().__init__(f"Insufficient stock for {names}")
+
+
+def _lines(items):
+    """{variant_id: quantity} for order or cart items, merging repeats and skipping deleted variants."""
+    lines = {}
+    for item in items:
+        if item.variant_id is not None:
+            lines[item.variant_id] = lines.get(item.variant_id, 0) + item.quantity
+    return lines
+
+
+def _quantity(lines):
+    return Case(
+        *[When(id=variant_id, then=Value(quantity)) for variant_id, quantity in lines.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def take_stock(items):
+    """
+    Decrement stock for every line in one conditional UPDATE ... WHERE
+    stock >= quantity. Either every line is taken or none is and OutOfStock
+    names the variants that were short.
+    """
+    lines = _lines(items)
+    if not lines:
+        return
+    quantity = _quantity(lines)
+    try:
+        with transaction.atomic():
+            updated = ProductVariant.objects.filter(id__in=lines.keys(), stock__gte=quantity).update(
+                stock=F('stock') - quantity
+            )
+            if updated != len(lines):
+                # Raising inside the savepoint rolls back the lines that did go through
+                raise OutOfStock([])
+    except OutOfStock:
+        # Looked up after the rollback, so lines that were taken and given back aren't named
+        short = ProductVariant.objects.select_related('product').filter(id__in=lines.keys(), stock__lt=quantity)
+        raise OutOfStock(list(short)) from None
+    transaction.on_commit(bump_catalog_version)
+
+
+def restore_stock(lines):
+    """Put {variant_id: quantity} back in one UPDATE."""
+    if not lines:
+        return
+    quantity = _quantity(lines)
+    ProductVariant.objects.filter(id__in=lines.keys()).update(stock=F('stock') + quantity)
+    transaction.on_commit(bump_catalog_version)
+
+
+def reserve_stock(order, items, ttl=RESERVATION_TTL):
+    """Take stock for an unpaid order and record it as held until now + ttl."""
+    take_stock(items)
+    expires_at = timezone.now() + ttl
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+        for variant_id, quantity in _lines(items).items()
+    ])
+
+
+def confirm_reservation(order):
+    """
+    Turn the order's reservation into a sale. If the reservation already ran
+    out and was released, the stock is taken again, raising OutOfStock if it
+    has gone in the meantime.
+    """
+    with transaction.atomic():
+        held = StockReservation.objects.select_for_update().filter(order=order)
+        if not held.exists():
+            take_stock(order.items.filter(is_cancelled=False))
+        held.delete()
+
+
+def release_order_stock(order, items):
+    """
+    Give back the stock held for these items of an order: reserved lines are
+    released, and lines of an order that took its stock outright are restored.
+    Items of an unpaid online order whose reservation has lapsed hold nothing.
+    """
+    lines = _lines(items)
+    with transaction.atomic():
+        reserved = StockReservation.objects.select_for_update().filter(order=order, variant_id__in=lines.keys())
+        reserved_ids = set(reserved.values_list('variant_id', flat=True))
+        reserved.delete()
+        holds_stock = order.payment_method != 'online' or order.is_paid
+        restore_stock({
+            variant_id: quantity for variant_id, quantity in lines.items()
+            if variant_id in reserved_ids or holds_stock
+        })
+
+
+def release_reservation(order):
+    """Release everything reserved for an order; returns how many lines were released."""
+    return release_reservations([order.id])
+
+
+def release_reservations(order_ids):
+    """Release everything reserved for these orders in a fixed number of queries; returns how many lines were released."""
+    with transaction.atomic():
+        reserved = list(StockReservation.objects.select_for_update().filter(order_id__in=order_ids))
+        StockReservation.objects.filter(id__in=[r.id for r in reserved]).delete()
+        restore_stock(_lines(reserved))
+    return len(reserved)
+
+
+def release_expired_reservations(now=None):
+    """Release every reservation past its expiry in a fixed number of queries; returns the order ids affected."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            StockReservation.objects.select_for_update(skip_locked=True).filter(expires_at__lt=now)
+        )
+        StockReservation.objects.filter(id__in=[r.id for r in expired]).delete()
+        restore_stock(_lines(expired))
+    return {r.order_id for r in expired}
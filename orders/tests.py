@@ -1,3 +1,129 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from products.models import Brand, Category, Product, ProductVariant
+from .models import Order, OrderItem, StockReservation
+from .stock import (
+    OutOfStock, confirm_reservation, release_expired_reservations, release_reservations, reserve_stock, take_stock,
+)
 
-# Create your tests here.
+User = get_user_model()
+
+
+class StockTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.category = Category.objects.create(name='Phones')
+        self.brand = Brand.objects.create(name='Acme')
+
+    def make_variant(self, name, stock):
+        product = Product.objects.create(name=name, description=name, category=self.category, brand=self.brand)
+        return ProductVariant.objects.create(product=product, color_name='Black', stock=stock, price=Decimal('100'))
+
+    def make_order(self, lines, payment_method='online'):
+        order = Order.objects.create(
+            user=self.user, subtotal=Decimal('100'), total_amount=Decimal('100'),
+            payment_method=payment_method, order_status='pending',
+        )
+        for variant, quantity in lines:
+            OrderItem.objects.create(
+                order=order, variant=variant, product_name=variant.product.name,
+                color_name=variant.color_name, color_code=variant.color_code, price=variant.price, quantity=quantity,
+            )
+        return order
+
+    def assertStock(self, variant, stock):
+        variant.refresh_from_db()
+        self.assertEqual(variant.stock, stock)
+
+
+class TakeStockTests(StockTestCase):
+
+    def test_takes_every_line(self):
+        phone, case = self.make_variant('Phone', 5), self.make_variant('Case', 3)
+        take_stock(self.make_order([(phone, 2), (case, 3)]).items.all())
+        self.assertStock(phone, 3)
+        self.assertStock(case, 0)
+
+    def test_repeated_lines_are_merged(self):
+        phone = self.make_variant('Phone', 3)
+        order = self.make_order([(phone, 2), (phone, 2)])
+        with self.assertRaises(OutOfStock):
+            take_stock(order.items.all())
+        self.assertStock(phone, 3)
+
+    def test_all_or_nothing_naming_only_short_lines(self):
+        phone, case, charger = self.make_variant('Phone', 5), self.make_variant('Case', 1), self.make_variant('Charger', 4)
+        order = self.make_order([(phone, 2), (case, 2), (charger, 1)])
+        with self.assertRaises(OutOfStock) as raised:
+            take_stock(order.items.all())
+        # The lines that fit are given back, and aren't reported as short
+        self.assertEqual(raised.exception.variants, [case])
+        self.assertStock(phone, 5)
+        self.assertStock(case, 1)
+        self.assertStock(charger, 4)
+
+
+class ReservationTests(StockTestCase):
+
+    def test_reserve_then_confirm(self):
+        phone = self.make_variant('Phone', 5)
+        order = self.make_order([(phone, 2)])
+        reserve_stock(order, order.items.all())
+        self.assertStock(phone, 3)
+        reservation = StockReservation.objects.get(order=order)
+        self.assertEqual((reservation.variant_id, reservation.quantity), (phone.id, 2))
+
+        confirm_reservation(order)
+        self.assertStock(phone, 3)
+        self.assertFalse(StockReservation.objects.filter(order=order).exists())
+
+    def test_reserve_fails_without_recording_anything(self):
+        phone = self.make_variant('Phone', 1)
+        order = self.make_order([(phone, 2)])
+        with self.assertRaises(OutOfStock):
+            reserve_stock(order, order.items.all())
+        self.assertStock(phone, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_confirm_after_lapse_takes_stock_again(self):
+        phone = self.make_variant('Phone', 5)
+        order = self.make_order([(phone, 2)])
+        confirm_reservation(order)
+        self.assertStock(phone, 3)
+
+    def test_confirm_after_lapse_fails_when_sold_out(self):
+        phone = self.make_variant('Phone', 1)
+        order = self.make_order([(phone, 2)])
+        with self.assertRaises(OutOfStock) as raised:
+            confirm_reservation(order)
+        self.assertEqual(raised.exception.variants, [phone])
+        self.assertStock(phone, 1)
+
+    def test_release_gives_the_stock_back_once(self):
+        phone, case = self.make_variant('Phone', 5), self.make_variant('Case', 5)
+        first = self.make_order([(phone, 2), (case, 1)])
+        second = self.make_order([(phone, 1)])
+        reserve_stock(first, first.items.all())
+        reserve_stock(second, second.items.all())
+        self.assertStock(phone, 2)
+
+        self.assertEqual(release_reservations([first.id, second.id]), 3)
+        self.assertStock(phone, 5)
+        self.assertStock(case, 5)
+        self.assertEqual(release_reservations([first.id, second.id]), 0)
+        self.assertStock(phone, 5)
+
+    def test_release_expired_leaves_live_reservations(self):
+        phone = self.make_variant('Phone', 5)
+        lapsed, live = self.make_order([(phone, 2)]), self.make_order([(phone, 1)])
+        reserve_stock(lapsed, lapsed.items.all(), ttl=timedelta(minutes=-1))
+        reserve_stock(live, live.items.all())
+
+        release_expired_reservations(now=timezone.now())
+        self.assertStock(phone, 4)
+        self.assertFalse(StockReservation.objects.filter(order=lapsed).exists())
+        self.assertTrue(StockReservation.objects.filter(order=live).exists())
@@ -1,23 +1,26 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 import json
-from offers.utils import get_offer_details
+from offers.utils import get_offer_prices
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
 from django.db.models import Q, Sum, Count, F
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.utils import timezone
 from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_POST, require_http_methods
 from decimal import Decimal
 from wallet.models import Wallet, WalletTransaction
-from weasyprint import HTML
+from documents.jobs import content_hash, enqueue_pdf, find_pdf, version_digest
+from documents.views import pdf_job_response
+from Server.pagination import CursorPaginator
 from .models import Order, OrderItem, OrderReturn, OrderItemReturn
+from .stock import release_order_stock
 from wallet.models import Wallet, WalletTransaction
-from cart.models import CartItem
+from products.cache import bump_catalog_version
 from products.models import Product, Review
 
 
@@ -53,18 +56,8 @@ def order(request):
             start_date = today - timedelta(days=90)
             orders = orders.filter(created_at__gte=start_date)
     
-    paginator = Paginator(orders, 5)
-    page = request.GET.get('page', 1)
-    
-    try:
-        orders_page = paginator.page(page)
-    except PageNotAnInteger:
-        orders_page = paginator.page(1)
-    except EmptyPage:
-        orders_page = paginator.page(paginator.num_pages)
-    cart_count = CartItem.objects.filter(cart__user=request.user).aggregate(total=Count('id'))['total'] or 0
+    orders_page = CursorPaginator(orders, 5, ('-created_at', '-id')).get_page(request)
     context = {
-        "cart_count": cart_count,
         'orders': orders_page,
         'search_query': search_query,
         'status_filter': status_filter,
@@ -90,12 +83,13 @@ def order_detail(request, order_number):
 
     active_subtotal = Decimal('0.00')
     total_offer_savings = Decimal('0.00')
+    prices = get_offer_prices(item.variant for item in order.items.all())
 
     for item in order.items.all():
         variant = item.variant
         if variant:
             base_price = variant.price
-            _, discount_pct, offer_type = get_offer_details(variant.product, base_price)
+            _, discount_pct, offer_type = prices[variant.id]
             item.original_price = base_price
             item.offer_type = offer_type
             item.offer_discount_pct = discount_pct
@@ -187,10 +181,8 @@ def cancel_order(request, order_number):
         cancel_reason = data.get('reason', 'No reason provided')
 
         with transaction.atomic():
+            release_order_stock(order, [item for item in order.items.all() if not item.is_cancelled])
             for item in order.items.all():
-                if item.variant and not item.is_cancelled:
-                    item.variant.stock += item.quantity
-                    item.variant.save()
                 item.is_cancelled = True
                 item.cancelled_at = timezone.now()
                 item.item_status = 'cancelled'
@@ -253,9 +245,7 @@ def cancel_order_item(request, order_number, item_id):
             return JsonResponse({'success': False, 'message': 'This item has already been cancelled.'}, status=400)
 
         with transaction.atomic():
-            if item.variant:
-                item.variant.stock += item.quantity
-                item.variant.save()
+            release_order_stock(order, [item])
             original_active_subtotal = order.items.filter(
                 is_cancelled=False, is_returned=False
             ).aggregate(total=Sum('subtotal'))['total'] or Decimal('0.00')
@@ -465,7 +455,7 @@ def request_item_return(request, order_number, item_id):
 
 
 def _build_item_rows(order):
-    active_items = order.items.filter(item_status='active')
+    active_items = order.items.filter(item_status='active').select_related('variant')
 
     coupon_discount = order.coupon_discount or Decimal('0')
     order_subtotal  = order.subtotal        or Decimal('1')  
@@ -538,18 +528,32 @@ def download_invoice(request, order_number):
     context = _get_invoice_context(order)
     return render(request, "user_side/profile/order_pdf.html", context)
 
-@login_required
-def generate_pdf(request, order_number):
-    order   = get_object_or_404(Order, order_number=order_number, user=request.user)
-    context = _get_invoice_context(order)
 
-    html_string = render_to_string('user_side/profile/invoice_template.html', context)
-    result      = HTML(string=html_string).write_pdf()
+INVOICE_TEMPLATE = 'user_side/profile/invoice_template.html'
+
+
+@lru_cache(maxsize=1)
+def _invoice_layout_digest():
+    return content_hash(get_template(INVOICE_TEMPLATE).template.source, stylesheet='invoice')
+
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Invoice_{order_number}.pdf"'
-    response.write(result)
-    return response
+def _invoice_digest(order):
+    """Names an invoice PDF by the order's version (order number and updated_at) and the invoice layout."""
+    return version_digest('invoice', order.order_number, order.updated_at.isoformat(), _invoice_layout_digest())
+
+
+@login_required
+def generate_pdf(request, order_number):
+    order    = get_object_or_404(Order, order_number=order_number, user=request.user)
+    digest   = _invoice_digest(order)
+    filename = f"Invoice_{order_number}.pdf"
+
+    # An invoice already rendered for this version of the order is sent without building it again
+    job = find_pdf(request.user, digest, filename)
+    if job is None:
+        html_string = render_to_string(INVOICE_TEMPLATE, _get_invoice_context(order))
+        job = enqueue_pdf(request.user, html_string, filename, stylesheet='invoice', digest=digest)
+    return pdf_job_response(request, job)
     
 
 @login_required
@@ -643,10 +647,7 @@ def AdminOrderListView(request):
     pending_count = next((item['count'] for item in payment_stats if item['payment_status'] == 'pending'), 0)
     failed_count = next((item['count'] for item in payment_stats if item['payment_status'] == 'failed'), 0)
     
-    from django.core.paginator import Paginator
-    paginator = Paginator(orders, 10) 
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(orders, 10, ('-created_at', '-id'), total='estimate').get_page(request)
     
     filter_status_choices = [
         ('confirmed', 'Confirmed'),
@@ -791,6 +792,7 @@ def AdminHandleReturnView(request, order_id):
                                 ProductVariant.objects.filter(id=order_item.variant.id).update(
                                     stock=F('stock') + order_item.quantity
                                 )
+                        transaction.on_commit(bump_catalog_version)
 
                         wallet, created = Wallet.objects.get_or_create(user=order.user)
 
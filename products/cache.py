@@ -0,0 +1,47 @@
+# products/cache.py
+import hashlib
+from django.core.cache import cache
+from django.utils import timezone
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, None)
+
+
+def bump_catalog_version():
+    """Invalidate every catalog cache entry at once by moving to a new key namespace."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, None)
+
+
+def catalog_cache_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"catalog:{catalog_version()}:{name}:{digest}"
+
+
+CATALOG_TIMEOUT = 60 * 15
+
+
+def catalog_timeout(variants, timeout=CATALOG_TIMEOUT):
+    """
+    Cache timeout for an entry built from these variants' prices: capped at
+    the first offer that runs out, since expiry doesn't bump the version.
+    """
+    expiries = [variant.offer_valid_until for variant in variants if variant.offer_valid_until]
+    if expiries:
+        timeout = min(timeout, int((min(expiries) - timezone.now()).total_seconds()))
+    return max(timeout, 1)
+
+
+def get_or_build(name, parts, build, timeout=CATALOG_TIMEOUT):
+    """Fetch a catalog cache entry, building and storing it on a miss."""
+    key = catalog_cache_key(name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout(value) if callable(timeout) else timeout)
+    return value
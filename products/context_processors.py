@@ -0,0 +1,13 @@
+# products/context_processors.py
+from .cache import CATALOG_TIMEOUT, catalog_version
+
+
+def catalog(request):
+    """
+    Version and timeout for {% cache %} fragments of catalog markup. The
+    version is passed uncalled so pages without fragments never touch the cache.
+    """
+    return {
+        'catalog_version': catalog_version,
+        'catalog_timeout': CATALOG_TIMEOUT,
+    }
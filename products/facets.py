@@ -0,0 +1,91 @@
+# products/facets.py
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .cache import catalog_cache_key
+from .models import Brand, Category, Product
+from .search import build_search_query
+
+PRICE_BUCKETS = [
+    ('0-1000', '₹0 - ₹1,000', 0, 1000),
+    ('1000-3000', '₹1,000 - ₹3,000', 1000, 3000),
+    ('3000-5000', '₹3,000 - ₹5,000', 3000, 5000),
+    ('5000-10000', '₹5,000 - ₹10,000', 5000, 10000),
+    ('10000+', '₹10,000+', 10000, None),
+]
+FACET_TIMEOUT = 60 * 15
+
+
+def _bucket_filter(low, high):
+    if high is None:
+        return Q(variants__effective_price__gte=low)
+    return Q(variants__effective_price__range=(low, high))
+
+
+def _facet_data(search_query):
+    products = Product.objects.filter(
+        is_listed=True, category__is_listed=True, brand__is_listed=True, variants__is_listed=True
+    )
+    query = build_search_query(search_query) if search_query else None
+    if query is not None:
+        products = products.filter(search_vector=query)
+
+    # One grouped query: product counts per (category, brand), split by price bucket
+    rows = products.order_by().values('category_id', 'brand_id').annotate(
+        total=Count('id', distinct=True),
+        **{
+            f'bucket_{index}': Count('id', distinct=True, filter=_bucket_filter(low, high))
+            for index, (_, _, low, high) in enumerate(PRICE_BUCKETS)
+        },
+    )
+    groups = [
+        (row['category_id'], row['brand_id'], row['total'], [row[f'bucket_{i}'] for i in range(len(PRICE_BUCKETS))])
+        for row in rows
+    ]
+    return {
+        'groups': groups,
+        'categories': list(Category.objects.filter(is_listed=True).values_list('id', 'name')),
+        'brands': list(Brand.objects.filter(is_listed=True).values_list('id', 'name')),
+    }
+
+
+def get_facets(search_query, category_filter='', brand_filter='', price_range=''):
+    """
+    Sidebar facets for the product listing. Each facet is counted with the
+    other selected filters applied but not its own, so every option shows how
+    many products picking it would return. The raw grouped counts are cached
+    per search term and invalidated with the catalog version.
+    """
+    key = catalog_cache_key('facets', search_query.lower())
+    data = cache.get(key)
+    if data is None:
+        data = _facet_data(search_query)
+        cache.set(key, data, FACET_TIMEOUT)
+
+    bucket_index = next((i for i, (value, *_) in enumerate(PRICE_BUCKETS) if value == price_range), None)
+
+    def count(total, buckets, use_price=True):
+        if use_price and bucket_index is not None:
+            return buckets[bucket_index]
+        return total
+
+    category_counts, brand_counts = {}, {}
+    price_counts = [0] * len(PRICE_BUCKETS)
+    for category_id, brand_id, total, buckets in data['groups']:
+        if not brand_filter or str(brand_id) == brand_filter:
+            category_counts[category_id] = category_counts.get(category_id, 0) + count(total, buckets)
+        if not category_filter or str(category_id) == category_filter:
+            brand_counts[brand_id] = brand_counts.get(brand_id, 0) + count(total, buckets)
+            if not brand_filter or str(brand_id) == brand_filter:
+                price_counts = [a + b for a, b in zip(price_counts, buckets)]
+
+    return {
+        'categories': [
+            {'id': pk, 'name': name, 'product_count': category_counts.get(pk, 0)} for pk, name in data['categories']
+        ],
+        'brands': [
+            {'id': pk, 'name': name, 'product_count': brand_counts.get(pk, 0)} for pk, name in data['brands']
+        ],
+        'price_options': [
+            (value, f"{label} ({price_counts[i]})") for i, (value, label, _, _) in enumerate(PRICE_BUCKETS)
+        ],
+    }
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:14
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_base_price(apps, schema_editor):
+    # Offers are applied afterwards by `manage.py refresh_effective_prices --all`
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    ProductVariant.objects.update(effective_price=F('price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='offer_valid_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(copy_base_price, migrations.RunPython.noop),
+    ]
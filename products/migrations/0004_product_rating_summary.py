@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:15
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    Product = apps.get_model('products', 'Product')
+    summaries = Review.objects.values('product_id').annotate(avg=Avg('rating'), count=Count('id'))
+    for row in summaries:
+        Product.objects.filter(id=row['product_id']).update(
+            rating_avg=Decimal(str(round(row['avg'], 1))),
+            rating_count=row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_productvariant_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
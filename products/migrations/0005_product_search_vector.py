@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    pairs = Product.objects.values_list('brand_id', 'brand__name', 'category_id', 'category__name').distinct()
+    for brand_id, brand_name, category_id, category_name in pairs:
+        Product.objects.filter(brand_id=brand_id, category_id=category_id).update(
+            search_vector=(
+                SearchVector('name', weight='A', config='english')
+                + SearchVector(Value(brand_name), weight='B', config='english')
+                + SearchVector(Value(category_name), weight='B', config='english')
+                + SearchVector('description', weight='C', config='english')
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
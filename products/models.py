@@ -1,6 +1,8 @@
 from django.db import models
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 User = get_user_model()
@@ -28,6 +30,14 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products")
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name="products")
     is_listed = models.BooleanField(default=True)
+    # Review summary, kept in sync by the Review signals in products.signals
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=1, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Full-text document over name/brand/category/description, see products.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [GinIndex(fields=['search_vector'], name='product_search_vector_gin')]
 
     def __str__(self):
         return self.name
@@ -39,10 +49,19 @@ class ProductVariant(models.Model):
     stock = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_listed = models.BooleanField(default=True)
+    # Price after the best running offer, maintained by offers.signals
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True)
+    offer_valid_until = models.DateTimeField(null=True, blank=True, db_index=True)
     
     def __str__(self):
         return f"{self.product.name} - {self.color_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
 class ProductImage(models.Model):
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="product_variants/")
@@ -0,0 +1,54 @@
+# products/search.py
+import re
+from decimal import Decimal
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+# SearchRank is a float4; ranks are cast to a fixed numeric so a cursor can store one exactly
+RANK_FIELD = DecimalField(max_digits=12, decimal_places=8)
+
+
+def build_search_vector(brand_name, category_name):
+    """
+    Weighted document for a product: name (A), brand and category (B),
+    description (C). Brand/category names are passed in as values because
+    UPDATE statements cannot follow joins.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(brand_name), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Value(category_name), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(products):
+    """Rebuild search_vector for a Product queryset, one UPDATE per brand/category pair."""
+    pairs = products.order_by().values_list('brand_id', 'brand__name', 'category_id', 'category__name').distinct()
+    for brand_id, brand_name, category_id, category_name in pairs:
+        products.filter(brand_id=brand_id, category_id=category_id).update(
+            search_vector=build_search_vector(brand_name, category_name)
+        )
+
+
+def build_search_query(text):
+    """
+    Turn free text into a prefix tsquery ("sams gal" -> "sams:* & gal:*") so
+    partially typed words still match. Returns None when nothing is searchable.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products(products, text):
+    """Filter a Product queryset by the search index and annotate a `rank` to order by."""
+    query = build_search_query(text)
+    if query is None:
+        return products.annotate(rank=Value(Decimal('0'), output_field=RANK_FIELD))
+    return products.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), RANK_FIELD)
+    )
@@ -0,0 +1,64 @@
+# products/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import bump_catalog_version
+from .models import Brand, Category, Product, ProductImage, ProductVariant, Review
+from .search import refresh_search_vectors
+from .suggest import suggest_index
+from .utils import refresh_rating_summary
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def variant_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    # Covers reviews edited or deleted in the admin as well as from the order page
+    refresh_rating_summary(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    bump_catalog_version()
+    refresh_search_vectors(Product.objects.filter(id=instance.id))
+    suggest_index.refresh_products(id=instance.id)
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, created, **kwargs):
+    bump_catalog_version()
+    if not created:
+        refresh_search_vectors(Product.objects.filter(brand=instance))
+    suggest_index.refresh_brand(instance)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    bump_catalog_version()
+    if not created:
+        refresh_search_vectors(Product.objects.filter(category=instance))
+    suggest_index.refresh_category(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+    suggest_index.remove('product', instance.id)
+
+
+@receiver(post_delete, sender=Brand)
+def brand_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+    suggest_index.remove('brand', instance.id)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+    suggest_index.remove('category', instance.id)
@@ -0,0 +1,174 @@
+# products/suggest.py
+import bisect
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import Min
+from django.urls import reverse
+from .models import Brand, Category, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _keys_for(label):
+    """Every word start of a label, so "gal" finds "Samsung Galaxy"."""
+    words = _normalize(label).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over listed product, brand and category names.
+    Keys live in a sorted list and are searched with bisect, so a lookup
+    never touches the database. Once SUGGEST_INDEX_TTL seconds have passed
+    the index is rebuilt in a background thread, one rebuild at a time,
+    while lookups keep reading the old one; this picks up changes made in
+    other worker processes. This process patches it incrementally via signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        self._keys = []      # sorted (key, kind, id)
+        self._items = {}     # (kind, id) -> {'type', 'id', 'name', 'url'}
+        self._built_at = None
+
+    # building -------------------------------------------------------------
+    def build(self):
+        items = {}
+        for brand in Brand.objects.filter(is_listed=True).only('id', 'name'):
+            items[('brand', brand.id)] = self._brand_item(brand)
+        for category in Category.objects.filter(is_listed=True).only('id', 'name'):
+            items[('category', category.id)] = self._category_item(category)
+        for row in self._listed_products():
+            items[('product', row['id'])] = self._product_item(row)
+
+        keys = sorted(
+            (key, kind, obj_id)
+            for (kind, obj_id), item in items.items()
+            for key in _keys_for(item['name'])
+        )
+        with self._lock:
+            self._keys, self._items, self._built_at = keys, items, time.monotonic()
+
+    def _listed_products(self, **filters):
+        return (
+            Product.objects.filter(
+                is_listed=True, brand__is_listed=True, category__is_listed=True,
+                variants__is_listed=True, **filters,
+            )
+            .values('id', 'name')
+            .annotate(variant_id=Min('variants__id'))
+        )
+
+    def _brand_item(self, brand):
+        return {'type': 'brand', 'id': brand.id, 'name': brand.name, 'url': f"{reverse('products')}?brand={brand.id}"}
+
+    def _category_item(self, category):
+        return {'type': 'category', 'id': category.id, 'name': category.name, 'url': f"{reverse('products')}?category={category.id}"}
+
+    def _product_item(self, row):
+        return {'type': 'product', 'id': row['id'], 'name': row['name'], 'url': reverse('product_detail', args=[row['variant_id']])}
+
+    # incremental updates --------------------------------------------------
+    def _remove(self, kind, obj_id):
+        item = self._items.pop((kind, obj_id), None)
+        if item:
+            for key in _keys_for(item['name']):
+                index = bisect.bisect_left(self._keys, (key, kind, obj_id))
+                if index < len(self._keys) and self._keys[index] == (key, kind, obj_id):
+                    del self._keys[index]
+
+    def _put(self, kind, obj_id, item):
+        self._remove(kind, obj_id)
+        if item:
+            self._items[(kind, obj_id)] = item
+            for key in _keys_for(item['name']):
+                bisect.insort(self._keys, (key, kind, obj_id))
+
+    def refresh_products(self, **filters):
+        """Re-read the products matching `filters` (e.g. id=5, brand_id=2)."""
+        if self._built_at is None:
+            return
+        product_ids = list(Product.objects.filter(**filters).values_list('id', flat=True))
+        listed = {row['id']: row for row in self._listed_products(id__in=product_ids)}
+        with self._lock:
+            for product_id in product_ids:
+                row = listed.get(product_id)
+                self._put('product', product_id, self._product_item(row) if row else None)
+
+    def refresh_brand(self, brand):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._put('brand', brand.id, self._brand_item(brand) if brand.is_listed else None)
+        self.refresh_products(brand_id=brand.id)
+
+    def refresh_category(self, category):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._put('category', category.id, self._category_item(category) if category.is_listed else None)
+        self.refresh_products(category_id=category.id)
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            self._remove(kind, obj_id)
+
+    # freshness ------------------------------------------------------------
+    def _rebuild_in_background(self):
+        try:
+            with self._build_lock:
+                self.build()
+        except Exception:
+            logger.exception("Rebuilding the suggest index failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            # The thread's own database connection would otherwise stay open
+            connection.close()
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            # Nothing to serve yet (the WSGI/ASGI entry points normally build first); build once, the rest wait
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+            return
+        if time.monotonic() - self._built_at <= getattr(settings, 'SUGGEST_INDEX_TTL', 300):
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    # lookup ---------------------------------------------------------------
+    def lookup(self, prefix, limit=8):
+        self._ensure_fresh()
+
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        results, seen = [], set()
+        with self._lock:
+            keys, items = self._keys, self._items
+            index = bisect.bisect_left(keys, (prefix,))
+            while index < len(keys) and keys[index][0].startswith(prefix) and len(results) < limit:
+                ref = keys[index][1:]
+                if ref not in seen:
+                    seen.add(ref)
+                    results.append(items[ref])
+                index += 1
+        return results
+
+
+suggest_index = SuggestIndex()
@@ -13,5 +13,6 @@ urlpatterns = [
 
     # User-side product 
     path('', views.products, name='products'),
+    path('suggest', views.suggest, name='product_suggest'),
     path('details/<int:variant_id>/', views.product_detail, name='product_detail'),
 ]
\ No newline at end of file
@@ -1,5 +1,9 @@
 # products/utils.py
-from .models import Product
+from decimal import Decimal
+from django.db.models import Avg, Count, Prefetch
+from .cache import bump_catalog_version
+from .models import Product, ProductVariant, ProductImage, Review
+
 def get_all_listed_products():
     """
     Return all listed products with their first variant and first image preloaded.
@@ -19,3 +23,34 @@ def get_all_listed_products():
             product.first_image = None
 
     return products
+
+
+def listed_variants_prefetch():
+    """
+    Prefetch for product querysets: listed variants cheapest first, stored on
+    product.listed_variants, each with its images in upload order.
+    """
+    return Prefetch(
+        'variants',
+        queryset=ProductVariant.objects.filter(is_listed=True).order_by('effective_price', 'id').prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.order_by('id'))
+        ),
+        to_attr='listed_variants',
+    )
+
+
+def first_image(variant):
+    """First image of a variant whose images were prefetched."""
+    images = variant.images.all()
+    return images[0] if images else None
+
+
+def refresh_rating_summary(product_id):
+    """Recompute Product.rating_avg / rating_count from its reviews."""
+    summary = Review.objects.filter(product_id=product_id).aggregate(avg=Avg('rating'), count=Count('id'))
+    Product.objects.filter(id=product_id).update(
+        rating_avg=Decimal(str(round(summary['avg'] or 0, 1))),
+        rating_count=summary['count'],
+    )
+    # update() skips signals, and cached listing and detail pages show the summary
+    bump_catalog_version()
@@ -3,209 +3,239 @@ from django.contrib.auth.decorators import user_passes_test
 from django.views.decorators.cache import cache_control
 from django.core.files.base import ContentFile
 from django.contrib import messages
+from django.http import JsonResponse
 from PIL import Image
 from wishlist.models import WishlistItem
 from .models import Category, Product, Brand, ProductVariant, ProductImage, Product, Review
-from cart.models import Cart, CartItem
-from django.core.paginator import Paginator
-from django.db.models import Min,  Q, Max, Count, Avg
+from cart.models import CartItem
+from Server.pagination import CURSOR_PARAM, CursorPaginator
+from django.db.models import Min, Max
 import base64
 import io
 from offers.models import ProductOffer
-from offers.utils import get_best_offer_price
+from offers.utils import get_offer_prices
+from .utils import listed_variants_prefetch, first_image
+from .search import search_products
+from .facets import get_facets
+from .cache import catalog_timeout, get_or_build
+from .suggest import suggest_index
 
 # User Side
 # -------------------------------------------
-def products(request):
+def _listing_page(request,search_query,category_filter,brand_filter,price_range,sort_by):
     products=Product.objects.filter(is_listed=True,category__is_listed=True,brand__is_listed=True,variants__is_listed=True
-    ).prefetch_related("variants__images","variants"
+    ).prefetch_related(listed_variants_prefetch()
     ).select_related("brand","category").distinct()
 
-    cart_count = CartItem.objects.filter(cart__user=request.user).aggregate(total=Count('id'))['total'] or 0
-
-    categories=Category.objects.filter(is_listed=True)
-    brands=Brand.objects.filter(is_listed=True)
-
-    search_query=request.GET.get('search','').strip()
     if search_query:
-        products=products.filter(Q(name__icontains=search_query)|
-        Q(description__icontains=search_query)|
-        Q(brand__name__icontains=search_query)|
-        Q(category__name__icontains=search_query))
-
-    category_filter=request.GET.get('category','').strip()
+        products=search_products(products,search_query)
     if category_filter:
         products=products.filter(category__id=category_filter)
-
-    brand_filter=request.GET.get('brand','').strip()
     if brand_filter:
         products=products.filter(brand__id=brand_filter)
 
-    price_range = request.GET.get('price_range', '').strip()
     if '-' in price_range:
         low, high = price_range.split('-')
-        products = products.filter(variants__price__range=(int(low), int(high)))
+        products = products.filter(variants__is_listed=True, variants__effective_price__range=(int(low), int(high)))
     elif price_range.endswith('+'):
         low = price_range.removesuffix('+')
-        products = products.filter(variants__price__gte=int(low))
+        products = products.filter(variants__is_listed=True, variants__effective_price__gte=int(low))
 
-    sort_by=request.GET.get('sort','').strip()
     if sort_by=='price-low':
-        products=products.annotate(min_price=Min('variants__price')).order_by('min_price')
+        products=products.annotate(min_price=Min('variants__effective_price'))
+        ordering=('min_price','-id')
     elif sort_by=='price-high':
-        products=products.annotate(max_price=Max('variants__price')).order_by('-max_price')
+        products=products.annotate(max_price=Max('variants__effective_price'))
+        ordering=('-max_price','-id')
     elif sort_by=='name-az':
-        products=products.order_by('name')
+        ordering=('name','id')
     elif sort_by=='name-za':
-        products=products.order_by('-name')
+        ordering=('-name','-id')
+    elif search_query:
+        ordering=('-rank','-id')
     else:
-        products=products.order_by('-id')
+        ordering=('-id',)
 
-    paginator=Paginator(products.distinct(),5)
-    page_obj=paginator.get_page(request.GET.get('page'))
+    page_obj=CursorPaginator(products.distinct(),5,ordering,total='estimate').get_page(request)
 
     product_display_data=[]
     for product in page_obj:
-        variants=product.variants.filter(is_listed=True)
-        lowest_variant=variants.order_by('price').first()
-        if not lowest_variant:
+        variants=product.listed_variants
+        if not variants:
             continue
+        lowest_variant=variants[0]
         total_stock=sum(v.stock for v in variants)
-        original_price=lowest_variant.price
-        final_price,discount_percentage=get_best_offer_price(product,original_price)
         product_display_data.append(
             {
                 'product':product,
                 'variant':lowest_variant,
-                'first_image':lowest_variant.images.first(),
-                'original_price':original_price,
-                'final_price':final_price,
-                'discount_percentage':discount_percentage,
+                'first_image':first_image(lowest_variant),
+                'original_price':lowest_variant.price,
                 'in_stock':total_stock>0,
                 'total_stock':total_stock,
-                'rating': round(Review.objects.filter(product=product).aggregate(avg=Avg('rating'))['avg'] or 0, 1),
-                'review_count': Review.objects.filter(product=product).count(),
+                'rating': product.rating_avg,
+                'review_count': product.rating_count,
                 })
+
+    prices=get_offer_prices([item['variant'] for item in product_display_data])
+    for item in product_display_data:
+        item['final_price'],item['discount_percentage'],_=prices[item['variant'].id]
+
+    page_obj.object_list=product_display_data
+    return page_obj
+
+
+def products(request):
+    search_query=request.GET.get('search','').strip()
+    category_filter=request.GET.get('category','').strip()
+    brand_filter=request.GET.get('brand','').strip()
+    price_range = request.GET.get('price_range', '').strip()
+    sort_by=request.GET.get('sort','').strip()
+
+    facets=get_facets(search_query,category_filter,brand_filter,price_range)
+
+    # The hydrated page is shared by everyone asking for the same filters and cursor
+    filters=(search_query.lower(),category_filter,brand_filter,price_range,sort_by)
+    page_obj=get_or_build(
+        'listing',
+        filters+(request.GET.get(CURSOR_PARAM,''),),
+        lambda: _listing_page(request,search_query,category_filter,brand_filter,price_range,sort_by),
+        timeout=lambda page: catalog_timeout(item['variant'] for item in page),
+    )
+    page_obj.request=request
+
     context={
         'page_obj':page_obj,
-        "cart_count" : cart_count,
-        'product_display_data':product_display_data,
-        'categories':categories,
-        'brands':brands,
+        'product_display_data':page_obj.object_list,
+        'categories':facets['categories'],
+        'brands':facets['brands'],
+        'price_options':facets['price_options'],
         'search_query':search_query,
         'selected_category':category_filter,
         'selected_brand':brand_filter,
         'selected_price_range':price_range,
         'selected_sort':sort_by,
-        'total_products':paginator.count
+        'total_products':page_obj.total,
+        # The grid fragments show offer prices, so they expire with the page's first offer
+        'listing_timeout':catalog_timeout(item['variant'] for item in page_obj.object_list),
         }
     return render(request,'user_side/product/product_listing.html', context)
 
 
 
+def suggest(request):
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({'results': suggest_index.lookup(query) if query else []})
+
+
 # Product Detail
+def _product_detail_data(variant_id):
+    """Everything on the detail page that is the same for every visitor, or {'error': message} if it can't be shown."""
+    default_variant = get_object_or_404(ProductVariant, id=variant_id, is_listed=True)
+    product = default_variant.product
+    if not product.is_listed or not product.category.is_listed or not product.brand.is_listed:
+        return {'error': "This product is not available."}
+
+    variants = list(ProductVariant.objects.filter(product=product, is_listed=True).select_related('product').prefetch_related('images'))
+    if not variants:
+        return {'error': "No variants available for this product."}
+
+    prices = get_offer_prices(variants)
+    original_price = default_variant.price
+    final_price, discount_percentage, applied_offer = prices[default_variant.id]
+
+    offer_type = None
+    offer_name = None
+    if applied_offer == 'product':
+        offer_type = "Product Offer"
+        offer_name = f"{discount_percentage}% off on this product"
+    elif applied_offer == 'brand':
+        offer_type = "Brand Offer"
+        offer_name = f"{discount_percentage}% off on all {product.brand.name} products"
+
+    total_stock = sum(v.stock for v in variants)
+
+    related_products = Product.objects.filter(category=product.category, is_listed=True).exclude(id=product.id).select_related('brand').prefetch_related(listed_variants_prefetch())[:4]
+    related_products_data = []
+    for related_product in related_products:
+        if related_product.listed_variants:
+            related_variant = related_product.listed_variants[0]
+            related_products_data.append({
+                'product': related_product,
+                'variant': related_variant,
+                'first_image': first_image(related_variant),
+                'original_price': related_variant.price,
+                'rating': related_product.rating_avg,
+                'review_count': related_product.rating_count,
+            })
+
+    related_prices = get_offer_prices([item['variant'] for item in related_products_data])
+    for item in related_products_data:
+        item['final_price'], item['discount_percentage'], _ = related_prices[item['variant'].id]
+
+    variants_data = []
+    for variant in variants:
+        variant_price, variant_discount, _ = prices[variant.id]
+        variants_data.append({
+            'id': variant.id,
+            'color_name': variant.color_name,
+            'color_code': variant.color_code,
+            'stock': variant.stock,
+            'original_price': variant.price,
+            'final_price': variant_price,
+            'discount_percentage': variant_discount,
+            'images': list(variant.images.all()),
+            'is_current': variant.id == default_variant.id,
+        })
+
+    return {
+        'product': product,
+        'variants': variants,
+        'variants_data': variants_data,
+        'default_variant': default_variant,
+        'rating': product.rating_avg,
+        'review_count': product.rating_count,
+        'reviews': list(Review.objects.filter(product=product).select_related('user').order_by('-created_at')),
+        'original_price': original_price,
+        'final_price': final_price,
+        'discount_percentage': discount_percentage,
+        'offer_type': offer_type,
+        'offer_name': offer_name,
+        'current_variant_stock': default_variant.stock,
+        'total_stock': total_stock,
+        'related_products': related_products_data,
+    }
+
+
 def product_detail(request, variant_id):
     try:
-        default_variant = get_object_or_404(ProductVariant, id=variant_id, is_listed=True)
-        product = default_variant.product
-        if not product.is_listed or not product.category.is_listed or not product.brand.is_listed:
-            messages.error(request, "This product is not available.")
-            return redirect('products')
-
-        variants = ProductVariant.objects.filter(product=product, is_listed=True).prefetch_related('images')
-        if not variants.exists():
-            messages.error(request, "No variants available for this product.")
+        data = get_or_build(
+            'product_detail',
+            (variant_id,),
+            lambda: _product_detail_data(variant_id),
+            timeout=lambda data: catalog_timeout(
+                data.get('variants', []) + [item['variant'] for item in data.get('related_products', [])]
+            ),
+        )
+        if 'error' in data:
+            messages.error(request, data['error'])
             return redirect('products')
 
+        # Per-user bits stay out of the cached entry
         wishlist_variants = []
         is_in_wishlist = False
         is_in_cart = False
-        cart_count = 0
 
         if request.user.is_authenticated:
             wishlist_variants = list(WishlistItem.objects.filter(user=request.user).values_list("variant_id", flat=True))
-            is_in_wishlist = default_variant.id in wishlist_variants
-            try:
-                user_cart = Cart.objects.get(user=request.user)
-                is_in_cart = CartItem.objects.filter(cart=user_cart, variant=default_variant).exists()
-                cart_count = CartItem.objects.filter(cart__user=request.user).aggregate(total=Count('id'))['total'] or 0
-            except Cart.DoesNotExist:
-                is_in_cart = False
-
-        original_price = default_variant.price
-        final_price, discount_percentage = get_best_offer_price(product, original_price)
-
-        offer_type = None
-        offer_name = None
-        product_offer = getattr(product, "product_offer", None)
-        brand_offer = getattr(product.brand, "brand_offer", None)
-        if product_offer and product_offer.is_valid() and product_offer.discount_percentage == discount_percentage:
-            offer_type = "Product Offer"
-            offer_name = f"{discount_percentage}% off on this product"
-        elif brand_offer and brand_offer.is_active and brand_offer.discount_percentage == discount_percentage:
-            offer_type = "Brand Offer"
-            offer_name = f"{discount_percentage}% off on all {product.brand.name} products"
-
-        total_stock = sum(v.stock for v in variants)
-
-        related_products = Product.objects.filter(category=product.category, is_listed=True).exclude(id=product.id).prefetch_related('variants__images')[:4]
-        related_products_data = []
-        for related_product in related_products:
-            related_variant = related_product.variants.filter(is_listed=True).first()
-            if related_variant:
-                rel_original_price = related_variant.price
-                rel_final_price, rel_discount = get_best_offer_price(related_product, rel_original_price)
-                rel_reviews = Review.objects.filter(product=related_product)
-                rel_count = rel_reviews.count()
-                rel_rating = round(rel_reviews.aggregate(avg=Avg('rating'))['avg'] or 0, 1)
-                related_products_data.append({
-                    'product': related_product,
-                    'variant': related_variant,
-                    'original_price': rel_original_price,
-                    'final_price': rel_final_price,
-                    'discount_percentage': rel_discount,
-                    'rating': rel_rating,
-                    'review_count': rel_count,
-                })
-
-        variants_data = []
-        for variant in variants:
-            variant_price, variant_discount = get_best_offer_price(product, variant.price)
-            variants_data.append({
-                'id': variant.id,
-                'color_name': variant.color_name,
-                'color_code': variant.color_code,
-                'stock': variant.stock,
-                'original_price': variant.price,
-                'final_price': variant_price,
-                'discount_percentage': variant_discount,
-                'images': list(variant.images.all()),
-                'is_current': variant.id == default_variant.id,
-            })
-        reviews = Review.objects.filter(product=product).select_related('user').order_by('-created_at')
-        review_count = reviews.count()
-        avg_rating = round(reviews.aggregate(avg=Avg('rating'))['avg'] or 0, 1)
+            is_in_wishlist = variant_id in wishlist_variants
+            is_in_cart = CartItem.objects.filter(cart__user=request.user, variant_id=variant_id).exists()
 
         context = {
-            'product': product,
-            'variants': variants,
-            'cart_count': cart_count,
-            'variants_data': variants_data,
-            'default_variant': default_variant,
+            **data,
             'wishlist_variants': wishlist_variants,
             'is_in_wishlist': is_in_wishlist,
             'is_in_cart': is_in_cart,
-            'rating': avg_rating,
-            'review_count': review_count,
-            'reviews': reviews,
-            'original_price': original_price,
-            'final_price': final_price,
-            'discount_percentage': discount_percentage,
-            'offer_type': offer_type,
-            'offer_name': offer_name,
-            'current_variant_stock': default_variant.stock,
-            'total_stock': total_stock,
-            'related_products': related_products_data,
         }
         return render(request, "user_side/product/product_detail.html", context)
 
@@ -221,10 +251,8 @@ def product_detail(request, variant_id):
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @user_passes_test(lambda u: u.is_superuser, login_url="admin_login")
 def AdminProductListView(request):
-    product_list = Product.objects.select_related("product_offer").prefetch_related("variants__images").order_by('-id')
-    paginator = Paginator(product_list, 5) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    product_list = Product.objects.select_related("product_offer").prefetch_related("variants__images")
+    page_obj = CursorPaginator(product_list, 5, ('-id',)).get_page(request)
 
     context = {
         "products": page_obj,
@@ -248,16 +276,14 @@ def AdminProductDetailView(request, id):
 @user_passes_test(lambda u: u.is_superuser, login_url="admin_login")
 def AdminProductsearchView(request):
     keyword = request.GET.get('keyword', "").strip()
-    product = Product.objects.all()
+    products = Product.objects.select_related("product_offer").prefetch_related("variants__images")
+    ordering = ('-id',)
 
     if keyword:
-        products = product.filter(
-            Q(name__icontains =  keyword) |
-            Q(category__name__icontains = keyword) |
-            Q(brand__name__icontains = keyword)
-        )
+        products = search_products(products, keyword)
+        ordering = ('-rank', '-id')
     context = {
-        "products": products,
+        "products": CursorPaginator(products, 5, ordering).get_page(request),
         "keyword": keyword,
     }
     return render(request, "admin_panel/product/product_management.html", context) #search
@@ -382,6 +408,7 @@ def AdminProductCreateView(request):
                         except Exception as e:
                             print(f"Error processing cropped image: {e}")
 
+        suggest_index.refresh_products(id=product.id)
         return redirect("admin_products")
     
     context = {
@@ -539,6 +566,7 @@ def AdminProductUpdateView(request, product_id):
                 
                 variants_created += 1
             
+            suggest_index.refresh_products(id=product.id)
             messages.success(request, f"Successfully added {variants_created} new variant(s)!")
             return redirect("edit_products", product_id=product.id)
         
@@ -556,6 +584,7 @@ def AdminProductUpdateView(request, product_id):
                         variant.is_listed = False
                         messages.success(request, f"Variant '{variant.color_name}' has been unlisted.")
                     variant.save()
+                    suggest_index.refresh_products(id=product.id)
                     return redirect("edit_products", product_id=product.id)
             
             # ---- Product update ----
@@ -623,6 +652,7 @@ def AdminProductVariantDeleteView(request, variant_id):
         return redirect("edit_products", product_id=product.id)
     variant_color = variant.color_name
     variant.delete()
+    suggest_index.refresh_products(id=product.id)
     messages.success(request,f"Variant '{variant_color}' was successfully deleted.")
     return redirect("edit_products", product_id=product.id)
 
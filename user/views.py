@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
 from django.views.decorators.cache import cache_control
 from django.db.models import Q
-from django.core.paginator import Paginator
+from Server.pagination import CursorPaginator
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate, login
 
@@ -17,10 +17,8 @@ def AdminUserListView(request):
     superusers = User.objects.filter(is_superuser=True).values("username", "email")
     current_super = request.user
     
-    users = CustomUser.objects.exclude(is_superuser=True).order_by("-created_at")
-    paginator = Paginator(users, 5)
-    page = request.GET.get('page', 1)
-    page_users = paginator.get_page(page)
+    users = CustomUser.objects.exclude(is_superuser=True)
+    page_users = CursorPaginator(users, 5, ("-created_at", "-id")).get_page(request)
 
     context = {
         "users": page_users,
@@ -47,13 +45,13 @@ def AdminUserStatusView(request, id):
     except CustomUser.DoesNotExist:
         messages.error(request, "User not found.")
 
-    keyword = request.GET.get("keyword", "").strip()
-    page = request.GET.get("page", 1)
-
-    if keyword:
-        return redirect(f"{reverse('users_search')}?keyword={keyword}&page={page}")
+    params = request.GET.copy()
+    params.pop("page", None)
+    if params.get("keyword", "").strip():
+        return redirect(f"{reverse('users_search')}?{params.urlencode()}")
     else:
-        return redirect(f"{reverse('admin_users')}?page={page}")
+        params.pop("keyword", None)
+        return redirect(f"{reverse('admin_users')}?{params.urlencode()}")
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @user_passes_test(lambda u: u.is_superuser, login_url="admin_login")
@@ -69,23 +67,20 @@ def AdminUserSearchView(request):
             Q(email__icontains=keyword) |
             Q(phone__icontains=keyword) |
             Q(created_at__date__icontains=keyword)
-        ).exclude(is_superuser=True).order_by("-created_at")
-
-        if not users.exists():
-            message = f"No users found matching '{keyword}'"
+        ).exclude(is_superuser=True)
     else:
         return redirect('admin_users')
 
-    paginator = Paginator(users, 5)
-    page = request.GET.get('page', 1)
-    page_users = paginator.get_page(page)
+    page_users = CursorPaginator(users, 5, ("-created_at", "-id"), total="estimate").get_page(request)
+    if not page_users.object_list:
+        message = f"No users found matching '{keyword}'"
 
     context = {
         "users": page_users,
         "message": message,
         "keyword": keyword,
         "is_search": True,
-        "total_results": users.count() if keyword else 0,
+        "total_results": page_users.total,
     }
     return render(request, "admin_panel/user_list/users_management.html", context)
 
@@ -2,6 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Sum
 from django.core.paginator import Paginator
+from Server.pagination import CursorPaginator
 from wallet.models import WalletTransaction
 from orders.models import Order
 from django.contrib.auth import get_user_model
@@ -27,17 +28,13 @@ def wallet_view(request):
     elif transaction_filter == 'debit':
         transactions = transactions.filter(transaction_type='debit')
     
-    transactions = transactions.order_by('-created_at')   
-    
-    paginator = Paginator(transactions, 5)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(transactions, 5, ('-created_at', '-id'), total='estimate').get_page(request)
     
     context = {
         'wallet': wallet,
         'transactions': page_obj,
         'transaction_filter': transaction_filter,
-        'total_transactions': paginator.count,
+        'total_transactions': page_obj.total,
     }
     return render(request, 'user_side/profile/wallet/wallet.html', context)
 
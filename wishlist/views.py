@@ -3,11 +3,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from .models import WishlistItem
 from products.models import ProductVariant
-from offers.utils import get_best_offer_price
+from offers.utils import get_offer_prices
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from cart.models import Cart, CartItem
-from django.db.models import Count
+from cart.models import Cart
 
 @login_required
 def wishlist(request):
@@ -32,6 +31,7 @@ def wishlist(request):
         pass
 
     wishlist_data = []
+    prices = get_offer_prices(item.variant for item in wishlist_items)
 
     for item in wishlist_items:
         variant = item.variant
@@ -39,7 +39,7 @@ def wishlist(request):
         product_image = variant.images.first()
 
         original_price = variant.price
-        final_price, discount_percentage = get_best_offer_price(product, original_price)
+        final_price, discount_percentage, _ = prices[variant.id]
 
         in_stock = variant.stock > 0
 
@@ -55,14 +55,9 @@ def wishlist(request):
             'is_in_cart': variant.id in cart_variant_ids,
         })
 
-    cart_count = CartItem.objects.filter(
-        cart__user=user
-    ).count()
-
     context = {
         'wishlist_data': wishlist_data,
         'total_items': len(wishlist_data),
-        'cart_count': cart_count,
     }
 
     return render(request, "user_side/wishlist/wishlist.html", context)